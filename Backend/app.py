@@ -1,20 +1,37 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, jsonify, render_template_string, Response, stream_with_context
 from werkzeug.security import generate_password_hash, check_password_hash
 import uuid
 import json
+import hashlib
+import math
 from db import users_collection, yields_collection,activities_collection
 from db import users_collection, yields_collection, activities_collection, db
-from groq import Groq
-from decouple import config
+from db import ping as ping_db, ensure_indexes
+import pymongo
+from llm_gateway import llm
+from jobs import JobQueue, JobQueueFullError
 import pandas as pd
-import joblib
 import numpy as np
 from datetime import datetime
 from bson import ObjectId
 from functools import wraps
 import pickle as pkl
 import re
-from plant_disease_model import predict_disease
+from model_registry import registry
+from fertilizer_model import FERTILIZER_FEATURES, predict_fertilizers
+from crop_recommendation_model import CROP_FEATURES, recommend_crops
+from cache import TTLCache, StaleWhileRevalidateCache, SemanticCache
+from embeddings import build_embedder, content_terms, key_terms, normalize_text
+from warmup import warmup, STARTUP_MODE
+from pagination import parse_page_args, fetch_page, serialize_document
+from export import export_response
+from gazetteer import geo_point
+from mandi_ingest import MANDI_API_BASE_URL, MANDI_API_KEY, latest_market_prices, stored_commodities
+from market_index import MarketIndex
+from market_catalog import MarketCatalog, load_catalog, DEFAULT_RADIUS_KM
+from route_planner import plan_routes, DEFAULT_TIME_BUDGET_MS
+import transport_costs
+import importlib
 from flask_cors import CORS
 import os
 from bson.objectid import ObjectId
@@ -24,16 +41,15 @@ from urllib.parse import urlencode
 import logging
 from typing import Dict, List, Optional, Any
 from collections import defaultdict
-from haversine import haversine
+from concurrent.futures import ThreadPoolExecutor
 import json
-import google.generativeai as genai
 import werkzeug.utils
 
 base_dir  = os.path.dirname(os.path.abspath(__file__))
-UPLOAD_FOLDER = "uploads"
 
 app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+# Paginated endpoints return the next page's cursor in X-Next-Cursor
+CORS(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=["X-Next-Cursor"])
 
 # Set up logging for transport optimizer
 transport_logger = logging.getLogger("transport_optimizer")
@@ -42,29 +58,42 @@ file_handler.setLevel(logging.INFO)
 transport_logger.addHandler(file_handler)
 transport_logger.setLevel(logging.INFO)
 
-# Mandi API Configuration
-MANDI_API_BASE_URL = "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
-MANDI_API_KEY = "579b464db66ec23bdd000001f5a25a2a2b0742cb77a83bfe30e97ba1" 
-
-# Simulated city data with coordinates (latitude, longitude)
-city_data = {
-    "Mumbai": (19.0760, 72.8777),
-    "Delhi": (28.7041, 77.1025),
-    "Bangalore": (12.9716, 77.5946),
-    "Chennai": (13.0827, 80.2707),
-    "Kolkata": (22.5726, 88.3639)
-}
-
-# Map city names to their corresponding states for API filtering
-city_to_state = {
-    "Mumbai": "Maharashtra",
-    "Delhi": "NCT of Delhi",
-    "Bangalore": "Karnataka",
-    "Chennai": "Tamil Nadu",
-    "Kolkata": "West Bengal"
+# Markets (mandis) the optimizer can sell at, from Mongo or datasets/mandis.csv.
+# Loaded through warmup (see the "market_catalog" subsystem) instead of at
+# import, so an unreachable Mongo doesn't hold up startup.
+def get_market_catalog() -> MarketCatalog:
+    """Catalog with .coords (name -> (lat, lng)) and .states (name -> state)"""
+    return warmup.require("market_catalog")
+
+def get_market_index() -> MarketIndex:
+    """Resolves Mandi market names to the catalog's cities/states"""
+    return warmup.require("market_index")
+
+# Reference prices per kg used when simulating prices
+BASE_CROP_PRICES = {
+    "Mumbai": 50.0, "Delhi": 55.0, "Bangalore": 52.0,
+    "Chennai": 48.0, "Kolkata": 53.0
 }
+DEFAULT_BASE_CROP_PRICE = 50.0
 
 # ------------------ Token Middleware ------------------
+# token -> user document, so authenticated calls skip the users lookup.
+# Entries for a user are dropped when login rotates their token.
+token_cache = TTLCache(
+    max_entries=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("TOKEN_CACHE_TTL", "300")),
+    name="auth_tokens"
+)
+
+def find_user_by_token(token: str) -> Optional[dict]:
+    user = token_cache.get(token)
+    if user is None:
+        user = users_collection.find_one({"token": token})
+        if user:
+            token_cache.set(token, user)
+    # Hand out a copy so a request can't modify the cached document
+    return dict(user) if user else None
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -77,7 +106,7 @@ def token_required(f):
             return jsonify({'error': 'Token is missing'}), 401
 
         # Try to find user with this token
-        user = users_collection.find_one({"token": token})
+        user = find_user_by_token(token)
         print(f"Token lookup result: {'User found' if user else 'No user found'}")
         
         # TEMPORARY WORKAROUND: If no user found with token, create a test user for development
@@ -103,6 +132,99 @@ def token_required(f):
         return f(user, *args, **kwargs)
     return decorated
 
+# ------------------ Async LLM Jobs ------------------
+# Slow LLM-backed endpoints can run on a bounded worker pool instead of
+# holding a request thread: clients opt in with ?async=1 or
+# "Prefer: respond-async", get 202 with a job id, and poll /api/jobs/<id>.
+llm_jobs = JobQueue(db["llm_jobs"])
+
+def wants_async() -> bool:
+    return request.args.get("async", "").lower() in ("1", "true") or \
+        "respond-async" in request.headers.get("Prefer", "")
+
+def job_owner() -> Optional[str]:
+    """Hash of the request's access token; a job submitted with a token can only be read with it"""
+    token = request.headers.get('x-access-token')
+    return hashlib.sha256(token.encode("utf-8")).hexdigest() if token else None
+
+def async_job(kind: str):
+    """
+    Let the decorated view run as a background job when the client asks.
+
+    The request (method, path, query, headers and raw body, including
+    uploads) is replayed in a test request context on a worker thread, so
+    the view's code is the same in both modes; its JSON body and status
+    code become the job result. Place it below @token_required so auth is
+    checked before queueing.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not wants_async():
+                return f(*args, **kwargs)
+
+            captured = dict(
+                path=request.path,
+                method=request.method,
+                query_string=request.query_string.decode("latin-1"),
+                headers=list(request.headers.items()),
+                data=request.get_data()
+            )
+
+            def run():
+                with app.test_request_context(**captured):
+                    response = app.make_response(f(*args, **kwargs))
+                    return response.get_json(silent=True), response.status_code
+
+            try:
+                job_id = llm_jobs.submit(kind, run, owner=job_owner())
+            except JobQueueFullError as e:
+                return jsonify({"error": str(e)}), 503
+            return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}), 202
+        return decorated
+    return decorator
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Job status and, once finished, its result. ?wait=<seconds> long-polls.
+
+    Jobs submitted with an x-access-token need the same token to be read;
+    to anyone else they look like unknown jobs.
+    """
+    try:
+        wait = float(request.args.get("wait", 0))
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    if not (math.isfinite(wait) and wait >= 0):
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+
+    # Check ownership before long-polling, so nobody can hold a request
+    # thread waiting on someone else's job
+    job = llm_jobs.get(job_id)
+    if job is None or (job.get("owner") and job["owner"] != job_owner()):
+        return jsonify({"error": "Job not found or expired"}), 404
+    if wait > 0 and job["status"] in ("queued", "running"):
+        job = llm_jobs.get(job_id, wait=wait) or job
+
+    response = {
+        "job_id": job["_id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "created_at": job["createdAt"].isoformat()
+    }
+    if job["status"] == "done":
+        response["status_code"] = job["statusCode"]
+        response["result"] = job["result"]
+    elif job["status"] == "error":
+        response["status_code"] = job["statusCode"]
+        response["error"] = job["error"]
+    return jsonify(response), 200
+
+@app.route('/api/jobs/stats', methods=['GET'])
+def get_job_stats():
+    return jsonify(llm_jobs.stats()), 200
+
 # ------------------ User Registration ------------------
 @app.route('/api/users/register', methods=['POST'])
 def register():
@@ -147,6 +269,8 @@ def login():
 
     token = str(uuid.uuid4())
     users_collection.update_one({'mobileno': mobileno}, {'$set': {'token': token}})
+    if user.get('token'):
+        token_cache.delete(user['token'])
 
     return jsonify({'token': token}), 200
 
@@ -160,23 +284,24 @@ def profile(current_user):
     })
 
 # ------------------ plant-disease-analysis ------------------
-@app.route('/api/plant-disease-analysis', methods=['POST'])
-def plant_disease_analysis():
-    if "image" not in request.files:
-        return jsonify({"error": "No image uploaded"}), 400
-
-    image = request.files["image"]
-    image_path = os.path.join(UPLOAD_FOLDER, image.filename)
-    image.save(image_path)
-
-    try:
-        result = predict_disease(image_path)
-    
-        predicted_label = result['class']
-        confidence = round(result['confidence']*100,2)
-
-
-        prompt = f"""
+# Classifier output keyed by a hash of the image bytes, and the LLM write-up
+# keyed by disease label. Set DISEASE_CACHE_DIR to keep both across restarts.
+DISEASE_CACHE_DIR = os.getenv("DISEASE_CACHE_DIR")
+disease_prediction_cache = TTLCache(
+    max_entries=int(os.getenv("DISEASE_PREDICTION_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("DISEASE_PREDICTION_CACHE_TTL", str(7 * 24 * 3600))),
+    disk_dir=os.path.join(DISEASE_CACHE_DIR, "predictions") if DISEASE_CACHE_DIR else None,
+    name="disease_predictions"
+)
+disease_info_cache = TTLCache(
+    max_entries=int(os.getenv("DISEASE_INFO_CACHE_SIZE", "256")),
+    ttl_seconds=float(os.getenv("DISEASE_INFO_CACHE_TTL", str(24 * 3600))),
+    disk_dir=os.path.join(DISEASE_CACHE_DIR, "info") if DISEASE_CACHE_DIR else None,
+    name="disease_info"
+)
+
+def generate_disease_info(predicted_label: str) -> str:
+    prompt = f"""
         The plant disease predicted is: **{predicted_label}**.
 
         As a plant pathology expert, generate a structured, informative JSON object with the following keys:
@@ -192,32 +317,51 @@ def plant_disease_analysis():
         Please be precise and strictly return only the valid JSON, no extra explanation.
         """
 
-        # Initialize Groq client with API key
-        client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    # Make the chat completion request
+    chat_completion = llm.groq_chat(
+        model="llama-3.3-70b-versatile",
+        messages=[
+            {
+                "role": "system",
+                "content": "You are a helpful assistant with deep agricultural and plant pathology knowledge."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        temperature=0.5,
+        max_completion_tokens=1024,
+        top_p=1,
+        stop=None,
+        stream=False
+    )
 
-        # Make the chat completion request
-        chat_completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant with deep agricultural and plant pathology knowledge."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.5,
-            max_completion_tokens=1024,
-            top_p=1,
-            stop=None,
-            stream=False
-        )
+    # Extract the response
+    return chat_completion.choices[0].message.content.strip()
 
-# Extract the response
-        detailed_info = chat_completion.choices[0].message.content.strip()
+@app.route('/api/plant-disease-analysis', methods=['POST'])
+@async_job("plant_disease_analysis")
+def plant_disease_analysis():
+    if "image" not in request.files:
+        return jsonify({"error": "No image uploaded"}), 400
 
+    image_bytes = request.files["image"].read()
+    if not image_bytes:
+        return jsonify({"error": "Empty image uploaded"}), 400
+
+    try:
+        # Repeat uploads of the same photo skip the classifier entirely
+        disease_model = warmup.require("plant_disease")
+        image_key = f"{disease_model.MODEL_NAME}:{disease_model.MODEL_BACKEND}:{hashlib.sha256(image_bytes).hexdigest()}"
+        result = disease_prediction_cache.get_or_set(image_key, lambda: disease_model.predict_disease(image_bytes))
+
+        predicted_label = result['class']
+        confidence = round(result['confidence']*100,2)
+
+        detailed_info = disease_info_cache.get_or_set(
+            predicted_label, lambda: generate_disease_info(predicted_label)
+        )
 
         return jsonify({
             "predictedDisease": predicted_label,
@@ -225,12 +369,48 @@ def plant_disease_analysis():
             "analysis": detailed_info
         }), 200
 
-
-
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+@app.route('/api/plant-disease-analysis/stats', methods=['GET'])
+def plant_disease_stats():
+    # Report without forcing the model to load
+    disease_model = warmup.peek("plant_disease")
+    if disease_model is None:
+        stats = {"backend": None, "status": warmup.status()["plant_disease"]["status"]}
+    else:
+        stats = disease_model.batcher.stats()
+        stats["backend"] = disease_model.MODEL_BACKEND
+    stats["caches"] = [disease_prediction_cache.stats(), disease_info_cache.stats()]
+    return jsonify(stats), 200
+
 # ------------------ Crop Recommendation ------------------
+@app.route('/api/crop-recommendation/predict', methods=['POST'])
+def crop_recommendation_predict():
+    """Rank crops with the local model; no network calls on this path."""
+    data = request.get_json(silent=True) or {}
+    missing_fields = [field for field in CROP_FEATURES if field not in data]
+    if missing_fields:
+        return jsonify({'error': f'Missing fields: {", ".join(missing_fields)}'}), 400
+
+    try:
+        top_k = int(data.get('top_k', 5))
+        ranked_crops = recommend_crops(data, top_k=max(1, top_k))
+        return jsonify({
+            'bestRecommendedCrop': ranked_crops[0]['crop'],
+            'rankedCrops': ranked_crops
+        }), 200
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid input: {str(e)}'}), 400
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+# LLM write-up for the crop recommendation. Clients fetch this separately
+# after /predict; the local ranking is passed to the model as context.
 @app.route('/api/crop-recommendation', methods=['POST'])
+@async_job("crop_recommendation")
 def crop_recommendation():
     REQUIRED_FIELDS = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall", "location"]
 
@@ -240,7 +420,16 @@ def crop_recommendation():
         return jsonify({'error': f'Missing fields: {", ".join(missing_fields)}'}), 400
 
     try:
-        client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        ranked_crops = recommend_crops(data)
+    except Exception as e:
+        print(f"Local crop model unavailable: {str(e)}")
+        ranked_crops = []
+
+    try:
+        model_hint = ""
+        if ranked_crops:
+            ranked_text = ", ".join(f"{c['crop']} ({c['probability']:.0%})" for c in ranked_crops)
+            model_hint = f"- Local crop model ranking: {ranked_text}"
 
         prompt = f"""
         Given the following agricultural parameters, recommend suitable crops and provide detailed guidance:
@@ -253,6 +442,7 @@ def crop_recommendation():
         - Rainfall: {data['rainfall']} mm
         - Humidity: {data['humidity']}%
         - Location: {data['location']}
+        {model_hint}
 
         Please provide a response in the following STRICT JSON format and  the json keys should not have whitespace and they should be in camelcase:
         {{
@@ -286,7 +476,7 @@ def crop_recommendation():
         Please return only valid JSON. Do not include any other text or explanation.
         """
 
-        chat_completion = client.chat.completions.create(
+        chat_completion = llm.groq_chat(
             model="llama-3.3-70b-versatile",  # replace with your available Groq model
             messages=[
                 {
@@ -314,6 +504,7 @@ def crop_recommendation():
 
         clean_json = json_match.group(0)
         parsed_response = json.loads(clean_json)
+        parsed_response['modelPredictions'] = ranked_crops
 
         return jsonify(parsed_response), 200
 
@@ -327,19 +518,38 @@ def crop_recommendation():
 @app.route('/api/yields', methods=['GET'])
 @token_required
 def get_yields(current_user):
+    # Keyset pagination: ?limit=&cursor=&order=asc|desc&fields=name,status
+    # The next page's cursor is returned in the X-Next-Cursor header.
     try:
-        user_yields = list(yields_collection.find({"userId": current_user["_id"]}))
+        page = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        user_yields, next_cursor = fetch_page(yields_collection, {"userId": current_user["_id"]}, page)
         
         # Convert ObjectId to string for JSON serialization
+        user_yields = [serialize_document(yield_item) for yield_item in user_yields]
         for yield_item in user_yields:
-            yield_item['id'] = str(yield_item.pop('_id'))
-            if 'userId' in yield_item:
-                yield_item['userId'] = str(yield_item['userId'])
+            yield_item['id'] = yield_item.pop('_id')
             
-        return jsonify(user_yields), 200
+        response = jsonify(user_yields)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response, 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/yields/export', methods=['GET'])
+@token_required
+def export_yields(current_user):
+    # Streams every yield of the current user; ?format=ndjson (default) or json
+    try:
+        cursor = yields_collection.find({"userId": current_user["_id"]}).sort("_id", 1)
+        return export_response(cursor, request.args.get('format', 'ndjson'), 'yields')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 @app.route('/api/yields/<yield_id>', methods=['GET'])
 @token_required
 def get_yield(current_user, yield_id):
@@ -522,29 +732,139 @@ def delete_yield(current_user, yield_id):
 
 
 
+# Extra fields required per activity type, on top of BASE_ACTIVITY_FIELDS
+BASE_ACTIVITY_FIELDS = ['yield_id', 'mobileno', 'activity_name', 'summary', 'amount']
+ACTIVITY_TYPE_FIELDS = {
+    'fertilizer': ['fertilizer_name', 'quantity', 'bill_image'],
+    'pesticide': ['pesticide_name', 'quantity', 'bill_image'],
+    'financial': ['financial_category', 'payment_method', 'receipt'],
+}
+
+# Largest batch accepted by the bulk activity endpoints
+MAX_ACTIVITY_BATCH = int(os.getenv("MAX_ACTIVITY_BATCH", "1000"))
+# Larger /api/mobile-activity/bulk batches must run as async jobs
+MAX_SYNC_LLM_BATCH = int(os.getenv("MAX_SYNC_LLM_BATCH", "20"))
+# Concurrent LLM calls per bulk request; always leaves gateway slots for
+# interactive endpoints such as /api/chat
+BULK_LLM_WORKERS = int(os.getenv("BULK_LLM_WORKERS", "2"))
+
+def missing_activity_fields(data: dict) -> Optional[str]:
+    """Return an error message if the activity lacks a required field"""
+    if not isinstance(data, dict) or 'activity_type' not in data:
+        return "Missing 'activity_type'"
+    if not isinstance(data['activity_type'], str):
+        return "'activity_type' must be a string"
+    required_fields = BASE_ACTIVITY_FIELDS + ACTIVITY_TYPE_FIELDS.get(data['activity_type'], [])
+    if not all(field in data for field in required_fields):
+        return "Missing required fields"
+    return None
+
+def build_activity(data: dict, user_id: ObjectId, yield_id: ObjectId) -> dict:
+    # Base activity data
+    activity = {
+        'userId': user_id,
+        'yieldId': yield_id,
+        'activity_type': data['activity_type'],
+        'activity_name': data['activity_name'],
+        'summary': data['summary'],
+        'amount': data['amount'],
+        'created_at': datetime.utcnow()
+    }
+
+    # Add extra fields
+    for field in ACTIVITY_TYPE_FIELDS.get(data['activity_type'], []):
+        activity[field] = data[field]
+    return activity
+
+def read_activity_batch() -> list:
+    """Read a batch from {"activities": [...]} or a bare JSON list"""
+    data = request.get_json(silent=True)
+    items = data.get('activities') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        raise ValueError("Provide a non-empty 'activities' list")
+    if len(items) > MAX_ACTIVITY_BATCH:
+        raise ValueError(f"Batch too large: {len(items)} items (max {MAX_ACTIVITY_BATCH})")
+    return items
+
+def resolve_activity_owners(items: list, results: dict) -> Dict[int, tuple]:
+    """
+    Resolve each item's user and yield with one $in query per collection
+
+    Items whose index is already in results are skipped; failures are
+    recorded there.
+
+    Returns:
+        Item index -> (user id, yield id) for items that passed
+    """
+    pending = [i for i in range(len(items)) if i not in results]
+
+    mobilenos = list({items[i]['mobileno'] for i in pending})
+    users = {
+        user['mobileno']: user['_id']
+        for user in users_collection.find({'mobileno': {'$in': mobilenos}}, {'mobileno': 1})
+    }
+
+    yield_ids = {}
+    for i in pending:
+        try:
+            yield_ids[i] = ObjectId(items[i]['yield_id'])
+        except Exception as e:
+            results[i] = {"index": i, "status": "error", "error": f"Invalid yield ID format: {str(e)}"}
+    yield_owners = {
+        yield_obj['_id']: yield_obj['userId']
+        for yield_obj in yields_collection.find({'_id': {'$in': list(set(yield_ids.values()))}}, {'userId': 1})
+    }
+
+    owners = {}
+    for i, yield_id in yield_ids.items():
+        user_id = users.get(items[i]['mobileno'])
+        if user_id is None:
+            results[i] = {"index": i, "status": "error", "error": "User not found"}
+        elif yield_owners.get(yield_id) != user_id:
+            results[i] = {"index": i, "status": "error", "error": "Yield not found for this user"}
+        else:
+            owners[i] = (user_id, yield_id)
+    return owners
+
+def insert_activities(activities: Dict[int, dict], results: dict):
+    """Insert documents keyed by item index in one unordered insert_many, recording each outcome"""
+    indices = list(activities)
+    if not indices:
+        return
+    for i in indices:
+        activities[i]['_id'] = ObjectId()
+
+    failed = {}
+    try:
+        activities_collection.insert_many([activities[i] for i in indices], ordered=False)
+    except pymongo.errors.BulkWriteError as e:
+        failed = {error['index']: error.get('errmsg', 'Write failed') for error in e.details.get('writeErrors', [])}
+
+    for position, i in enumerate(indices):
+        if position in failed:
+            results[i] = {"index": i, "status": "error", "error": failed[position]}
+        else:
+            results[i] = {"index": i, "status": "created", "id": str(activities[i]['_id'])}
+
+def bulk_activity_response(results: dict, total: int):
+    ordered = [results[i] for i in range(total)]
+    created = sum(1 for result in ordered if result['status'] == 'created')
+    return jsonify({
+        "created": created,
+        "failed": total - created,
+        "results": ordered
+    }), 201 if created == total else 207
+
 @app.route('/api/create_activity', methods=['POST'])
 def create_activity():
     data = request.get_json()
 
-    if not data or 'activity_type' not in data:
-        return jsonify({"error": "Missing 'activity_type'"}), 400
+    error = missing_activity_fields(data)
+    if error:
+        return jsonify({"error": error}), 400
 
     activity_type = data['activity_type']
 
-    # Required fields per activity type
-    if activity_type == 'fertilizer':
-        required_fields = ['yield_id', 'mobileno', 'activity_name', 'summary', 'amount', 'fertilizer_name', 'quantity', 'bill_image']
-    elif activity_type == 'pesticide':
-        required_fields = ['yield_id', 'mobileno', 'activity_name', 'summary', 'amount', 'pesticide_name', 'quantity', 'bill_image']
-    elif activity_type == 'financial':
-        required_fields = ['yield_id', 'mobileno', 'activity_name', 'summary', 'amount', 'financial_category', 'payment_method', 'receipt']
-    else:
-        required_fields = ['yield_id', 'mobileno', 'activity_name', 'summary', 'amount']
-
-    # Check for missing fields
-    if not all(field in data for field in required_fields):
-        return jsonify({"error": "Missing required fields"}), 400
-
     # Get user by mobile number
     user = users_collection.find_one({'mobileno': data['mobileno']})
     if not user:
@@ -562,37 +882,37 @@ def create_activity():
     if not yield_obj:
         return jsonify({"error": "Yield not found for this user"}), 404
 
-    # Base activity data
-    activity = {
-        'userId': user['_id'],
-        'yieldId': yield_obj['_id'],
-        'activity_type': data['activity_type'],
-        'activity_name': data['activity_name'],
-        'summary': data['summary'],
-        'amount': data['amount'],
-        'created_at': datetime.utcnow()
-    }
-
-    # Add extra fields
-    if activity_type == 'fertilizer':
-        activity['fertilizer_name'] = data['fertilizer_name']
-        activity['quantity'] = data['quantity']
-        activity['bill_image'] = data['bill_image']
+    # Insert into activities_collection
+    activities_collection.insert_one(build_activity(data, user['_id'], yield_obj['_id']))
 
-    elif activity_type == 'pesticide':
-        activity['pesticide_name'] = data['pesticide_name']
-        activity['quantity'] = data['quantity']
-        activity['bill_image'] = data['bill_image']
+    return jsonify({"message": f"{activity_type.capitalize()} activity created successfully."}), 201
 
-    elif activity_type == 'financial':
-        activity['financial_category'] = data['financial_category']
-        activity['payment_method'] = data['payment_method']
-        activity['receipt'] = data['receipt']
+# Offline sync: many activities in one request. Each item is validated on
+# its own; the response lists a result per item in request order.
+@app.route('/api/create_activity/bulk', methods=['POST'])
+def create_activities_bulk():
+    try:
+        items = read_activity_batch()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    results = {}
+    for i, item in enumerate(items):
+        error = missing_activity_fields(item)
+        if not error and not isinstance(item['mobileno'], (str, int)):
+            error = "Invalid mobileno"
+        if error:
+            results[i] = {"index": i, "status": "error", "error": error}
 
-    # Insert into activities_collection
-    activities_collection.insert_one(activity)
+    try:
+        owners = resolve_activity_owners(items, results)
+        insert_activities({
+            i: build_activity(items[i], user_id, yield_id) for i, (user_id, yield_id) in owners.items()
+        }, results)
+    except Exception as e:
+        return jsonify({"error": f"Failed to create activities: {str(e)}"}), 500
 
-    return jsonify({"message": f"{activity_type.capitalize()} activity created successfully."}), 201
+    return bulk_activity_response(results, len(items))
 
 @app.route('/api/activities',methods=['POST'])
 def get_activities():
@@ -621,40 +941,103 @@ def get_activities():
     if not yield_obj:
         return jsonify({"error": "Yield not found for this user"}), 404
     print(yield_obj)
+
+    # Optional keyset pagination: limit, cursor, order and fields in the body
+    try:
+        page = parse_page_args(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     # Fetch activities matching both user and yield
-    activities = list(activities_collection.find({
+    activities, next_cursor = fetch_page(activities_collection, {
         'userId': user['_id'],
         'yieldId': yield_obj['_id']
-    }))
-    # print(activities)
+    }, page)
 
-    # Convert ObjectId to string for JSON serializability
-    for activity in activities:
-        activity['_id'] = str(activity['_id'])
-        activity['userId'] = str(activity['userId'])
-        activity['yieldId'] = str(activity['yieldId'])
-        activity['created_at'] = activity['created_at'].isoformat()
+    # Convert ObjectId and datetime values for JSON serializability
+    activities = [serialize_document(activity) for activity in activities]
 
-    return jsonify({"activities": activities}), 200
+    response = jsonify({"activities": activities, "next_cursor": next_cursor})
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
+
+@app.route('/api/activities/export', methods=['GET'])
+@token_required
+def export_activities(current_user):
+    # Streams the current user's activities, optionally for one ?yield_id=
+    query = {'userId': current_user['_id']}
+    if request.args.get('yield_id'):
+        try:
+            query['yieldId'] = ObjectId(request.args['yield_id'])
+        except Exception as e:
+            return jsonify({"error": f"Invalid yield ID format: {str(e)}"}), 400
 
-# ------------------ Chatbot API ------------------
-@app.route('/api/chat', methods=['POST'])
-def chatbot():
     try:
-        data = request.json
-        user_input = data.get('message', '')
-        model = data.get('model', 'llama-3.3-70b-versatile')
-        temperature = float(data.get('temperature', 0.7))
-        max_tokens = int(data.get('max_tokens', 400))
-        
-        if not user_input:
-            return jsonify({'error': 'No message provided'}), 400
-        
-        # Initialize Groq client with API key
-        client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        
-        # Create the chat prompt with HTML formatting instructions and emphasis on brevity
-        prompt = f"""
+        cursor = activities_collection.find(query).sort('_id', 1)
+        return export_response(cursor, request.args.get('format', 'ndjson'), 'activities')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+# ------------------ Chatbot API ------------------
+# Two-tier answer cache. The exact tier is keyed by the normalized question
+# and generation settings; the semantic tier catches rephrasings whose
+# embedding is within CHAT_SEMANTIC_THRESHOLD cosine similarity and which
+# have the same numbers, negations and question words (embeddings.key_terms).
+# The hashing embedder scores questions that differ in one content word
+# ("tomato"/"potato") as near-identical, so with it a semantic hit also needs
+# the same stemmed content words; it then only absorbs differences in
+# stopwords, punctuation, word order and inflection, so its threshold can
+# be lower.
+chat_embedder = build_embedder()
+chat_exact_cache = TTLCache(
+    max_entries=int(os.getenv("CHAT_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("CHAT_CACHE_TTL", str(24 * 3600))),
+    name="chat_exact"
+)
+chat_semantic_cache = SemanticCache(
+    chat_embedder.embed,
+    threshold=float(os.getenv("CHAT_SEMANTIC_THRESHOLD", "0.9" if chat_embedder.name == "transformer" else "0.7")),
+    max_entries=int(os.getenv("CHAT_SEMANTIC_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("CHAT_CACHE_TTL", str(24 * 3600))),
+    name="chat_semantic"
+)
+
+def chat_cache_partition(user_input: str, settings: tuple) -> tuple:
+    """Semantic cache partition: only questions in the same partition can share an answer"""
+    if chat_embedder.name == "hashing":
+        return settings, key_terms(user_input), content_terms(user_input)
+    return settings, key_terms(user_input)
+
+def chat_cache_lookup(user_input: str, settings: tuple):
+    """
+    Return (response, tier, vector); response is None on a miss
+
+    The embedding computed for the semantic lookup is returned so storing
+    the answer afterwards doesn't embed the question twice.
+    """
+    exact_key = json.dumps([normalize_text(user_input), *settings])
+    response = chat_exact_cache.get(exact_key)
+    if response is not None:
+        return response, "exact", None
+
+    vector = chat_embedder.embed(user_input)
+    response, similarity = chat_semantic_cache.get(user_input, partition=chat_cache_partition(user_input, settings),
+                                                   vector=vector)
+    if response is not None:
+        # Promote so the next identical phrasing is an exact hit
+        chat_exact_cache.set(exact_key, response)
+        return response, "semantic", vector
+    return None, None, vector
+
+def chat_cache_store(user_input: str, settings: tuple, response: str, vector=None):
+    chat_exact_cache.set(json.dumps([normalize_text(user_input), *settings]), response)
+    chat_semantic_cache.set(user_input, response, partition=chat_cache_partition(user_input, settings),
+                            vector=vector)
+
+def build_chat_messages(user_input: str) -> List[dict]:
+    # Create the chat prompt with HTML formatting instructions and emphasis on brevity
+    prompt = f"""
         As a helpful agricultural assistant, please respond to the following query: 
         
         {user_input}
@@ -673,29 +1056,106 @@ def chatbot():
         
         Do not include opening/closing HTML, body, or head tags - just the content HTML.
         """
+    return [
+        {
+            "role": "system",
+            "content": "You are a knowledgeable agricultural assistant. Provide BRIEF, CONCISE responses focused on farming practices. Format with minimal HTML for readability. Never exceed 400 tokens."
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def stream_chat_response(params: dict, on_complete=None) -> Response:
+    """
+    Forward Groq tokens to the client as Server-Sent Events
+
+    Each token arrives as a default "message" event {"token": ...}; the
+    stream ends with a "done" event carrying the full response, or an
+    "error" event. If the client disconnects, the generator is closed and
+    the upstream Groq stream with it. on_complete receives the full
+    response of a stream that finished.
+    """
+    def events():
+        parts = []
+        tokens = llm.groq_stream(**params)
+        try:
+            for token in tokens:
+                parts.append(token)
+                yield sse_event({"token": token})
+            response = "".join(parts).strip()
+            if on_complete:
+                on_complete(response)
+            yield sse_event({"response": response}, event="done")
+        except GeneratorExit:
+            print(f"Chat stream cancelled by client after {len(parts)} tokens")
+            raise
+        except Exception as e:
+            print(f"Error in chat stream: {str(e)}")
+            yield sse_event({"error": str(e)}, event="error")
+        finally:
+            tokens.close()
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/api/chat', methods=['POST'])
+def chatbot():
+    """
+    Answer an agricultural question.
+
+    Send "stream": true in the body (or Accept: text/event-stream) to get the
+    answer as Server-Sent Events while it is generated; otherwise the full
+    response is returned as JSON.
+    """
+    try:
+        data = request.json
+        user_input = data.get('message', '')
+        model = data.get('model', 'llama-3.3-70b-versatile')
+        temperature = float(data.get('temperature', 0.7))
+        max_tokens = int(data.get('max_tokens', 400))
+        stream = bool(data.get('stream')) or 'text/event-stream' in request.headers.get('Accept', '')
         
-        # Make the chat completion request
-        chat_completion = client.chat.completions.create(
+        if not user_input:
+            return jsonify({'error': 'No message provided'}), 400
+        
+        settings = (model, temperature, max_tokens)
+        cached, tier, vector = chat_cache_lookup(user_input, settings)
+        if cached is not None:
+            if stream:
+                events = [sse_event({"token": cached}), sse_event({"response": cached, "cached": tier}, event="done")]
+                return Response(events, mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+            return jsonify({'response': cached, 'cached': tier}), 200
+        
+        params = dict(
             model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a knowledgeable agricultural assistant. Provide BRIEF, CONCISE responses focused on farming practices. Format with minimal HTML for readability. Never exceed 400 tokens."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+            messages=build_chat_messages(user_input),
             temperature=temperature,
             max_completion_tokens=max_tokens,
             top_p=1,
-            stop=None,
-            stream=False
+            stop=None
         )
         
+        if stream:
+            return stream_chat_response(
+                params, on_complete=lambda response: chat_cache_store(user_input, settings, response, vector)
+            )
+        
+        # Make the chat completion request
+        chat_completion = llm.groq_chat(stream=False, **params)
+        
         # Extract the response
         response = chat_completion.choices[0].message.content.strip()
+        chat_cache_store(user_input, settings, response, vector)
         
         return jsonify({'response': response}), 200
         
@@ -705,170 +1165,179 @@ def chatbot():
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+# Fetch current commodity prices from the Mandi API (uncached)
+def fetch_market_prices(commodity: str, state: Optional[str] = None) -> Dict[str, float]:
+    """
+    Fetch current commodity prices per market from the Mandi API
+    
+    Args:
+        commodity: The commodity to search for (e.g., "Rice", "Wheat")
+        state: Optional state to filter results
+        
+    Returns:
+        Dictionary mapping market names to prices (empty if no records)
+
+    Raises:
+        RuntimeError: if the API does not answer with HTTP 200
+    """
+    params = {
+        "api-key": MANDI_API_KEY,
+        "format": "json",
+        "limit": 1000,  # Get a good number of records
+        "filters[commodity]": commodity
+    }
+    
+    if state:
+        params["filters[state.keyword]"] = state
+        
+    # Build the URL with parameters
+    query_string = urlencode(params)
+    url = f"{MANDI_API_BASE_URL}?{query_string}"
+    
+    transport_logger.info(f"Fetching prices from Mandi API for {commodity}")
+    response = requests.get(url, timeout=10)
+    
+    if response.status_code != 200:
+        raise RuntimeError(f"Mandi API request failed with status code {response.status_code}: {response.text}")
+
+    data = response.json()
+    prices = {}
+    
+    # Extract prices for each market
+    for record in data.get("records") or []:
+        market = record.get("market")
+        price = record.get("modal_price")
+        state_name = record.get("state")
+        
+        if market and price and state_name:
+            # Convert price to float
+            try:
+                price_float = float(price)
+                # Add to our prices dictionary
+                if market not in prices:
+                    prices[market] = price_float
+                else:
+                    # If market already exists, use the lower price (conservative)
+                    prices[market] = min(prices[market], price_float)
+            except (ValueError, TypeError):
+                transport_logger.warning(f"Invalid price value for {market}: {price}")
+    
+    transport_logger.info(f"Fetched {len(prices)} market prices for {commodity}")
+    return prices
+
+# Market prices per (commodity, state). Fresh for MANDI_PRICE_TTL seconds, then
+# served stale for up to MANDI_PRICE_STALE_TTL more while one background refresh
+# runs; concurrent misses for the same key share a single upstream call.
+mandi_price_cache = StaleWhileRevalidateCache(
+    fetch_market_prices,
+    ttl_seconds=float(os.getenv("MANDI_PRICE_TTL", "900")),
+    stale_seconds=float(os.getenv("MANDI_PRICE_STALE_TTL", "3600")),
+    name="mandi_prices"
+)
+
 # Function to fetch real commodity prices from Mandi API
-def fetch_mandi_prices(commodity: str, state: Optional[str] = None) -> Dict[str, float]:
+def fetch_mandi_prices(commodity: str, state: Optional[str] = None,
+                       cities: Optional[List[str]] = None) -> Dict[str, float]:
     """
-    Fetch current commodity prices from the Mandi API
+    Fetch current commodity prices from the local Mandi store filled by
+    mandi_ingest, falling back to the Mandi API (through the price cache)
+    when nothing recent has been ingested for the commodity
     
     Args:
         commodity: The commodity to search for (e.g., "Rice", "Wheat")
         state: Optional state to filter results
+        cities: Catalog markets to price (default: all of them)
         
     Returns:
         Dictionary mapping market/city names to prices
     """
     try:
-        params = {
-            "api-key": MANDI_API_KEY,
-            "format": "json",
-            "limit": 1000,  # Get a good number of records
-            "filters[commodity]": commodity
-        }
-        
-        if state:
-            params["filters[state.keyword]"] = state
-            
-        # Build the URL with parameters
-        query_string = urlencode(params)
-        url = f"{MANDI_API_BASE_URL}?{query_string}"
-        
-        transport_logger.info(f"Fetching prices from Mandi API for {commodity}")
-        response = requests.get(url, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Check if we have valid records
-            if "records" in data and data["records"]:
-                prices = {}
-                
-                # Extract prices for each market
-                for record in data["records"]:
-                    market = record.get("market")
-                    price = record.get("modal_price")
-                    state_name = record.get("state")
-                    
-                    if market and price and state_name:
-                        # Convert price to float
-                        try:
-                            price_float = float(price)
-                            # Add to our prices dictionary
-                            if market not in prices:
-                                prices[market] = price_float
-                            else:
-                                # If market already exists, use the lower price (conservative)
-                                prices[market] = min(prices[market], price_float)
-                        except (ValueError, TypeError):
-                            transport_logger.warning(f"Invalid price value for {market}: {price}")
-                
-                transport_logger.info(f"Fetched {len(prices)} market prices for {commodity}")
-                
-                # If we didn't find any prices, use simulated data
-                if not prices:
-                    transport_logger.warning(f"No price data found for {commodity}, using simulated data")
-                    return simulate_crop_prices(commodity)
-                
-                # Map market prices to our city list based on state
-                city_prices = map_market_to_city_prices(prices, commodity)
-                return city_prices
-            else:
-                transport_logger.warning(f"No records found for {commodity} in Mandi API")
-                return simulate_crop_prices(commodity)
-        else:
-            transport_logger.error(f"Mandi API request failed with status code {response.status_code}: {response.text}")
-            return simulate_crop_prices(commodity)
+        prices = latest_market_prices(commodity, state)
     except Exception as e:
-        transport_logger.error(f"Error fetching prices from Mandi API: {str(e)}")
-        return simulate_crop_prices(commodity)
+        transport_logger.error(f"Error reading stored Mandi prices: {str(e)}")
+        prices = {}
+
+    if not prices:
+        try:
+            prices = mandi_price_cache.get((commodity, state))
+        except Exception as e:
+            transport_logger.error(f"Error fetching prices from Mandi API: {str(e)}")
+            return simulate_crop_prices(commodity, cities)
+
+    # If we didn't find any prices, use simulated data
+    if not prices:
+        transport_logger.warning(f"No price data found for {commodity}, using simulated data")
+        return simulate_crop_prices(commodity, cities)
+    
+    # Map market prices to our city list based on state
+    return map_market_to_city_prices(prices, commodity, cities)
 
-def map_market_to_city_prices(market_prices: Dict[str, float], commodity: str) -> Dict[str, float]:
+def map_market_to_city_prices(market_prices: Dict[str, float], commodity: str,
+                              cities: Optional[List[str]] = None) -> Dict[str, float]:
     """
     Map market prices to our city list based on state information
     
     Args:
         market_prices: Dictionary of market name to price
         commodity: The commodity name
+        cities: Catalog markets to price (default: all of them)
         
     Returns:
         Dictionary mapping city names to prices
     """
-    city_prices = {}
-    
-    # First try to find direct market matches with our cities
-    for city in city_data.keys():
-        # Check if the city name is in market names
-        for market, price in market_prices.items():
-            if city.lower() in market.lower():
-                city_prices[city] = price
-                break
-    
-    # For cities without direct matches, use state average
-    state_prices = defaultdict(list)
-    
-    # Group prices by state
-    for city, state in city_to_state.items():
-        for market, price in market_prices.items():
-            # Simple heuristic - if market contains state name or vice versa
-            if state.lower() in market.lower() or market.lower() in state.lower():
-                state_prices[state].append(price)
-    
-    # Calculate state averages
-    state_avg_prices = {}
-    for state, prices in state_prices.items():
-        if prices:
-            state_avg_prices[state] = sum(prices) / len(prices)
+    catalog = get_market_catalog()
+    cities = list(catalog.coords) if cities is None else cities
+    matched_prices, state_avg_prices = get_market_index().map_prices(market_prices)
+    city_prices = {city: matched_prices[city] for city in cities if city in matched_prices}
     
     # Assign state average prices to cities without direct matches
-    for city in city_data.keys():
+    for city in cities:
         if city not in city_prices:
-            state = city_to_state.get(city)
+            state = catalog.states.get(city)
             if state and state in state_avg_prices:
                 city_prices[city] = state_avg_prices[state]
     
     # For any remaining cities, generate simulated prices
-    base_prices = {
-        "Mumbai": 50.0, "Delhi": 55.0, "Bangalore": 52.0,
-        "Chennai": 48.0, "Kolkata": 53.0
-    }
-    
-    for city in city_data.keys():
+    for city in cities:
         if city not in city_prices:
             # Use base price with small random variation
-            city_prices[city] = base_prices[city] * (1 + random.uniform(-0.05, 0.05))
+            base_price = BASE_CROP_PRICES.get(city, DEFAULT_BASE_CROP_PRICE)
+            city_prices[city] = base_price * (1 + random.uniform(-0.05, 0.05))
     
-    transport_logger.info(f"Mapped market prices to cities for {commodity}: {city_prices}")
+    transport_logger.info(f"Mapped market prices to {len(city_prices)} cities for {commodity}")
     return city_prices
 
 # Simulated crop price API (fallback)
-def simulate_crop_prices(crop: str) -> Dict[str, float]:
+def simulate_crop_prices(crop: str, cities: Optional[List[str]] = None) -> Dict[str, float]:
+    cities = list(get_market_catalog().coords) if cities is None else cities
     try:
-        base_prices = {
-            "Mumbai": 50.0, "Delhi": 55.0, "Bangalore": 52.0,
-            "Chennai": 48.0, "Kolkata": 53.0
+        prices = {
+            city: BASE_CROP_PRICES.get(city, DEFAULT_BASE_CROP_PRICE) * (1 + random.uniform(-0.05, 0.05))
+            for city in cities
         }
-        prices = {city: price * (1 + random.uniform(-0.05, 0.05)) for city, price in base_prices.items()}
-        transport_logger.info(f"Generated simulated prices for {crop}: {prices}")
+        transport_logger.info(f"Generated simulated prices for {crop} in {len(prices)} cities")
         return prices
     except Exception as e:
         transport_logger.error(f"Failed to generate simulated crop prices: {str(e)}")
-        return {city: 50.0 for city in city_data}
+        return {city: DEFAULT_BASE_CROP_PRICE for city in cities}
 
 # Fetch crop prices - tries real API first, falls back to simulation
-def fetch_crop_prices(crop: str) -> Dict[str, float]:
+def fetch_crop_prices(crop: str, cities: Optional[List[str]] = None) -> Dict[str, float]:
+    cities = list(get_market_catalog().coords) if cities is None else cities
     try:
         # Try to get real prices from Mandi API
-        prices = fetch_mandi_prices(crop)
+        prices = fetch_mandi_prices(crop, cities=cities)
         
         # If we got prices for all cities, return them
-        if all(city in prices for city in city_data.keys()):
+        if all(city in prices for city in cities):
             return prices
         
         # Otherwise, use simulated prices
         transport_logger.warning(f"Incomplete price data for {crop}, using simulated data")
-        return simulate_crop_prices(crop)
+        return simulate_crop_prices(crop, cities)
     except Exception as e:
         transport_logger.error(f"Failed to fetch crop prices: {str(e)}")
-        return simulate_crop_prices(crop)
+        return simulate_crop_prices(crop, cities)
 
 # Fetch dynamic fuel price (simulated)
 def fetch_fuel_price() -> float:
@@ -883,25 +1352,25 @@ def fetch_fuel_price() -> float:
         return 1.20
 
 # Calculate transportation cost
-def calculate_transport_cost(origin: str, destination: str, crop_weight_kg: float) -> float:
+def calculate_transport_cost(origin: str, destination: str, crop_weight_kg: float,
+                             fuel_price: Optional[float] = None) -> float:
     try:
         # Validate inputs
-        if origin not in city_data:
+        catalog = get_market_catalog()
+        if origin not in catalog.coords:
             transport_logger.error(f"Invalid origin city: {origin}")
             return 0.0
-        if destination not in city_data:
+        if destination not in catalog.coords:
             transport_logger.error(f"Invalid destination city: {destination}")
             return 0.0
         if crop_weight_kg <= 0:
             transport_logger.error(f"Invalid crop weight: {crop_weight_kg}")
             return 0.0
             
-        origin_coords = city_data[origin]
-        dest_coords = city_data[destination]
-        distance_km = haversine(origin_coords, dest_coords)
-        fuel_price = fetch_fuel_price()
-        # Adjusted formula: Assume a truck with 5 km/liter efficiency and $0.50 per km base cost
-        transport_cost = (distance_km / 5 * fuel_price * 100) + (distance_km * 0.50 * (crop_weight_kg / 100))  # Scaled for 100 kg
+        distance_km = catalog.distance(origin, destination)
+        if fuel_price is None:
+            fuel_price = fetch_fuel_price()
+        transport_cost = float(transport_costs.transport_cost(distance_km, crop_weight_kg, fuel_price))
         transport_logger.info(f"Transport cost from {origin} to {destination}: ${transport_cost:.2f} for {crop_weight_kg} kg")
         return transport_cost
     except Exception as e:
@@ -913,10 +1382,12 @@ class TransportOptimizer:
     def __init__(self):
         self.current_city = None
 
-    def optimize_transport(self, current_city: str, crop: str, crop_weight_kg: float) -> Dict:
+    def optimize_transport(self, current_city: str, crop: str, crop_weight_kg: float,
+                           radius_km: float = DEFAULT_RADIUS_KM) -> Dict:
         try:
             # Validate inputs
-            if current_city not in city_data:
+            catalog = get_market_catalog()
+            if current_city not in catalog.coords:
                 transport_logger.error(f"Invalid current city: {current_city}")
                 current_city = "Mumbai"  # Default to Mumbai if invalid
                 
@@ -929,14 +1400,24 @@ class TransportOptimizer:
                 crop_weight_kg = 100.0  # Default to 100kg if invalid
             
             self.current_city = current_city
-            crop_prices = fetch_crop_prices(crop)
+
+            # Only markets within reach are priced and evaluated; the ball tree
+            # finds them without scanning the catalog
+            candidates, distances_km = catalog.nearby(current_city, radius_km)
+            crop_prices = fetch_crop_prices(crop, candidates)
+
+            # One fuel price for the whole optimization, and every candidate's
+            # cost in a single vectorized pass
+            fuel_price = fetch_fuel_price()
+            costs = transport_costs.transport_cost(distances_km, crop_weight_kg, fuel_price)
 
             results = defaultdict(dict)
-            for city, price in crop_prices.items():
+            for city, cost in zip(candidates, costs):
+                price = crop_prices[city]
                 if city == current_city:
                     transport_cost = 0.0  # No transport cost if selling in current city
                 else:
-                    transport_cost = calculate_transport_cost(current_city, city, crop_weight_kg)
+                    transport_cost = float(cost)
                 revenue = price * crop_weight_kg
                 net_profit = revenue - transport_cost
                 results[city] = {
@@ -946,7 +1427,7 @@ class TransportOptimizer:
                 }
 
             results = dict(results)
-            transport_logger.info(f"Calculated results: {results}")
+            transport_logger.info(f"Evaluated {len(results)} markets within {radius_km} km of {current_city} at fuel price ${fuel_price:.2f}/liter")
 
             best_city = max(results.items(), key=lambda x: x[1]["net_profit"])[0]
             recommendation = {
@@ -972,6 +1453,17 @@ class TransportOptimizer:
 @app.route('/api/commodities', methods=['GET'])
 def get_commodities():
     try:
+        try:
+            commodities = stored_commodities()
+        except Exception as e:
+            transport_logger.error(f"Error reading stored commodities: {str(e)}")
+            commodities = []
+        if commodities:
+            return jsonify({
+                "status": "success",
+                "commodities": commodities
+            }), 200
+
         params = {
             "api-key": MANDI_API_KEY,
             "format": "json",
@@ -1037,20 +1529,24 @@ def optimize_transport():
         current_city = data.get("current_city", "Mumbai")
         crop = data.get("crop", "Rice")
         crop_weight_kg = float(data.get("crop_weight_kg", 100.0))
+        radius_km = float(data.get("radius_km", DEFAULT_RADIUS_KM))
 
         # Validate inputs
-        if current_city not in city_data:
-            return jsonify({"error": f"Invalid city: {current_city}. Available cities: {list(city_data.keys())}"}), 400
+        catalog = get_market_catalog()
+        if current_city not in catalog.coords:
+            return jsonify({"error": f"Invalid city: {current_city}. Available cities: {list(catalog.coords)}"}), 400
+        if radius_km <= 0:
+            return jsonify({"error": "radius_km must be positive"}), 400
 
         optimizer = TransportOptimizer()
-        result = optimizer.optimize_transport(current_city, crop, crop_weight_kg)
+        result = optimizer.optimize_transport(current_city, crop, crop_weight_kg, radius_km)
 
         # Create map URL with query parameters
-        map_url = f"/api/view-map?city={current_city}&best_city={result['best_city']}&crop={crop}&crop_weight_kg={crop_weight_kg}"
+        map_url = f"/api/view-map?city={current_city}&best_city={result['best_city']}&crop={crop}&crop_weight_kg={crop_weight_kg}&radius_km={radius_km}"
 
         response = {
             "optimization_result": result,
-            "available_cities": list(city_data.keys()),
+            "available_cities": list(catalog.coords),
             "map_url": map_url
         }
         return jsonify(response), 200
@@ -1058,8 +1554,76 @@ def optimize_transport():
         transport_logger.error(f"Optimization failed: {str(e)}")
         return jsonify({"error": f"Optimization failed: {str(e)}", "status": "Error"}), 500
 
+# Multi-stop routes for several farmers' loads sharing a fleet of trucks
+@app.route('/api/optimize-routes', methods=['POST'])
+def optimize_routes():
+    """
+    Expects JSON:
+        loads: [{"farmer", "city", "weight_kg", "crop" (default: top-level crop)}]
+        trucks: [{"id", "capacity_kg", "depot" (default: first load's city)}]
+        crop, radius_km, time_budget_ms: optional
+    """
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"error": "No input data provided"}), 400
+
+        default_crop = data.get("crop", "Rice")
+        radius_km = float(data.get("radius_km", DEFAULT_RADIUS_KM))
+        time_budget_ms = float(data.get("time_budget_ms", DEFAULT_TIME_BUDGET_MS))
+        raw_loads = data.get("loads") or []
+        raw_trucks = data.get("trucks") or []
+
+        if not raw_loads or not raw_trucks:
+            return jsonify({"error": "loads and trucks are required"}), 400
+        if not (math.isfinite(radius_km) and radius_km > 0 and math.isfinite(time_budget_ms) and time_budget_ms > 0):
+            return jsonify({"error": "radius_km and time_budget_ms must be positive numbers"}), 400
+
+        catalog = get_market_catalog()
+        loads = []
+        for i, load in enumerate(raw_loads):
+            city = load.get("city")
+            if city not in catalog.coords:
+                return jsonify({"error": f"Invalid city in load {i}: {city}"}), 400
+            weight_kg = float(load.get("weight_kg", 0))
+            if not (math.isfinite(weight_kg) and weight_kg > 0):
+                return jsonify({"error": f"Invalid weight in load {i}: {weight_kg}"}), 400
+            loads.append({
+                "farmer": load.get("farmer", f"farmer-{i + 1}"),
+                "city": city,
+                "crop": load.get("crop", default_crop),
+                "weight_kg": weight_kg
+            })
+
+        trucks = []
+        for i, truck in enumerate(raw_trucks):
+            depot = truck.get("depot", loads[0]["city"])
+            if depot not in catalog.coords:
+                return jsonify({"error": f"Invalid depot for truck {i}: {depot}"}), 400
+            capacity_kg = float(truck.get("capacity_kg", 0))
+            if not (math.isfinite(capacity_kg) and capacity_kg > 0):
+                return jsonify({"error": f"Invalid capacity for truck {i}: {capacity_kg}"}), 400
+            trucks.append({"id": truck.get("id", f"truck-{i + 1}"), "capacity_kg": capacity_kg, "depot": depot})
+
+        # Markets within reach of any pickup
+        markets = []
+        for city in dict.fromkeys(load["city"] for load in loads):
+            markets.extend(catalog.nearby(city, radius_km)[0])
+        markets = list(dict.fromkeys(markets))
+
+        prices = {crop: fetch_crop_prices(crop, markets) for crop in {load["crop"] for load in loads}}
+        result = plan_routes(loads, trucks, markets, catalog.coords, prices, fetch_fuel_price(), time_budget_ms)
+        transport_logger.info(f"Planned {len(result['routes'])} routes for {len(loads)} loads: {result['solver']}")
+        return jsonify(result), 200
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid input: {str(e)}"}), 400
+    except Exception as e:
+        transport_logger.error(f"Route optimization failed: {str(e)}")
+        return jsonify({"error": f"Route optimization failed: {str(e)}", "status": "Error"}), 500
+
 @app.route('/api/cities', methods=['GET'])
 def get_cities():
+    city_data = get_market_catalog().coords
     return jsonify({
         "cities": list(city_data.keys()),
         "map_info": {city: {"lat": coords[0], "lng": coords[1]} for city, coords in city_data.items()}
@@ -1294,33 +1858,36 @@ def view_map():
         best_city = request.args.get('best_city', 'Delhi')
         
         # Validate cities
-        if current_city not in city_data:
+        catalog = get_market_catalog()
+        if current_city not in catalog.coords:
             current_city = "Mumbai"  # Default if invalid
-        if best_city not in city_data:
+        if best_city not in catalog.coords:
             best_city = "Delhi"  # Default if invalid
             
         crop = request.args.get('crop', 'Rice')
         crop_weight_kg = float(request.args.get('crop_weight_kg', 100.0))
+        radius_km = float(request.args.get('radius_km', DEFAULT_RADIUS_KM))
         
         # Get optimization data
         optimizer = TransportOptimizer()
-        result = optimizer.optimize_transport(current_city, crop, crop_weight_kg)
+        result = optimizer.optimize_transport(current_city, crop, crop_weight_kg, radius_km)
         
         city_details = result["city_details"]
         recommend_transport = result["recommend_transport"]
+        if best_city not in city_details:
+            best_city = result["best_city"]
         
-        # Prepare data for the map
-        crop_prices = fetch_crop_prices(crop)
+        # Prepare data for the map, reusing the prices the optimizer just used
+        crop_prices = {city: details["price_per_kg"] for city, details in city_details.items()}
         
-        # Format city data for JS
+        # Format city data for JS, limited to the markets the optimizer evaluated
         cities_formatted = {}
-        for city, coords in city_data.items():
+        for city in city_details:
+            coords = catalog.coords[city]
             cities_formatted[city] = {"lat": coords[0], "lng": coords[1]}
         
         # Calculate direct distance
-        current_coords = city_data[current_city]
-        best_coords = city_data[best_city]
-        distance_km = haversine(current_coords, best_coords)
+        distance_km = catalog.distance(current_city, best_city)
         
         # Convert data to JSON for template
         cities_json = json.dumps(cities_formatted)
@@ -1357,37 +1924,164 @@ def view_map():
 
 # ------------------ Lease Marketplace API ------------------
 
+# sort option -> (field to order by before _id, direction)
+LEASE_ITEM_SORTS = {
+    "oldest": (None, pymongo.ASCENDING),
+    "newest": (None, pymongo.DESCENDING),
+    "price_asc": ("pricePerHour", pymongo.ASCENDING),
+    "price_desc": ("pricePerHour", pymongo.DESCENDING),
+}
+
+def build_lease_item_query(args) -> dict:
+    """
+    Build the Mongo filter for the lease marketplace search
+
+    Supported args: category (comma separated for several), available
+    (true/false), min_price / max_price on pricePerHour, and q for free-text
+    search over name and description.
+    """
+    query = {}
+
+    category = args.get('category')
+    if category:
+        categories = [c.strip() for c in category.split(',') if c.strip()]
+        query['category'] = categories[0] if len(categories) == 1 else {'$in': categories}
+
+    available = args.get('available')
+    if available is not None and available != '':
+        if available.lower() not in ('true', 'false'):
+            raise ValueError("available must be 'true' or 'false'")
+        query['available'] = available.lower() == 'true'
+
+    price_range = {}
+    for arg, operator in (('min_price', '$gte'), ('max_price', '$lte')):
+        if args.get(arg):
+            try:
+                price_range[operator] = float(args[arg])
+            except ValueError:
+                raise ValueError(f"{arg} must be a number")
+            if not math.isfinite(price_range[operator]):
+                raise ValueError(f"{arg} must be a finite number")
+    if price_range:
+        query['pricePerHour'] = price_range
+
+    search = (args.get('q') or '').strip()
+    if search:
+        query['$text'] = {'$search': search}
+
+    return query
+
+def coordinates_point(latitude, longitude) -> dict:
+    """
+    GeoJSON point for a latitude/longitude pair
+
+    Raises:
+        ValueError: if either is not a finite number in range
+    """
+    try:
+        lat, lng = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        raise ValueError("latitude and longitude must be numbers")
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError("latitude must be within [-90, 90] and longitude within [-180, 180]")
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+def lease_item_geo(data: dict) -> Optional[dict]:
+    """
+    GeoJSON point for a lease item: explicit latitude/longitude, else the gazetteer
+
+    Raises:
+        ValueError: if only one coordinate is given or they are invalid
+    """
+    has_lat, has_lng = data.get('latitude') is not None, data.get('longitude') is not None
+    if has_lat != has_lng:
+        raise ValueError("latitude and longitude must be given together")
+    if has_lat:
+        return coordinates_point(data['latitude'], data['longitude'])
+    return geo_point(data.get('location', ''))
+
+DEFAULT_NEAR_RADIUS_KM = 50
+
+def parse_near(args) -> Optional[dict]:
+    """
+    Read the "near me" options: near=<lat>,<lng> or near=<place name>, plus radius_km
+
+    Returns:
+        None when near is not given, else {"point": GeoJSON point, "radius_m": ...}
+    """
+    near = (args.get('near') or '').strip()
+    if not near:
+        return None
+
+    parts = near.split(',')
+    try:
+        lat, lng = float(parts[0]), float(parts[1])
+    except (ValueError, IndexError):
+        point = geo_point(near)
+        if point is None:
+            raise ValueError(f"Unknown location: {near}")
+    else:
+        point = coordinates_point(lat, lng)
+
+    try:
+        radius_km = float(args.get('radius_km', DEFAULT_NEAR_RADIUS_KM))
+    except ValueError:
+        raise ValueError("radius_km must be a number")
+    if not (math.isfinite(radius_km) and radius_km > 0):
+        raise ValueError("radius_km must be a positive number")
+    return {"point": point, "radius_m": radius_km * 1000}
+
+def find_lease_items_near(query: dict, near: dict, limit: int) -> list:
+    # $geoNear sorts by distance and must be the first pipeline stage
+    pipeline = [
+        {"$geoNear": {
+            "near": near["point"],
+            "key": "geo",
+            "distanceField": "distance_m",
+            "maxDistance": near["radius_m"],
+            "query": query,
+            "spherical": True
+        }},
+        {"$limit": limit}
+    ]
+    items = []
+    for item in db.lease_items.aggregate(pipeline):
+        item['distanceKm'] = round(item.pop('distance_m') / 1000, 2)
+        items.append(item)
+    return items
+
 @app.route('/api/lease-items', methods=['GET'])
 def get_lease_items():
+    # Filtered, paginated catalog. See build_lease_item_query for the filters;
+    # also takes sort=oldest|newest|price_asc|price_desc, limit and cursor.
+    # With near=... (see parse_near) the closest items within radius_km are
+    # returned instead, nearest first, each with distanceKm.
     try:
-        lease_items = db.lease_items.find({})
-        lease_items_list = []
-        
-        for item in lease_items:
-            try:
-                # Convert ObjectId to string
-                item['_id'] = str(item['_id'])
-                
-                # Make sure ownerId is serialized properly
-                if 'ownerId' in item and item['ownerId']:
-                    item['ownerId'] = str(item['ownerId'])
-                
-                # Convert datetime objects to strings
-                if 'createdAt' in item and item['createdAt']:
-                    item['createdAt'] = item['createdAt'].isoformat()
-                if 'updatedAt' in item and item['updatedAt']:
-                    item['updatedAt'] = item['updatedAt'].isoformat()
-                
-                lease_items_list.append(item)
-            except Exception as item_error:
-                print(f"Error processing lease item: {str(item_error)}")
-                # Skip this item and continue with the next
-                continue
+        query = build_lease_item_query(request.args)
+        sort = request.args.get('sort', 'oldest')
+        if sort not in LEASE_ITEM_SORTS:
+            raise ValueError(f"sort must be one of {', '.join(LEASE_ITEM_SORTS)}")
+        page = parse_page_args(request.args)
+        near = parse_near(request.args)
+        if near and '$text' in query:
+            raise ValueError("q cannot be combined with near")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        if near:
+            query.setdefault('available', True)
+            lease_items, next_cursor = find_lease_items_near(query, near, page['limit']), None
+        else:
+            sort_field, page['order'] = LEASE_ITEM_SORTS[sort]
+            lease_items, next_cursor = fetch_page(db.lease_items, query, page, sort_field)
+        lease_items_list = [serialize_document(item) for item in lease_items]
             
         print(f"Retrieved {len(lease_items_list)} lease items successfully")
         return jsonify({
             "status": "success",
-            "data": lease_items_list
+            "data": lease_items_list,
+            "next_cursor": next_cursor
         }), 200
     except Exception as e:
         print(f"Error in get_lease_items: {str(e)}")
@@ -1395,6 +2089,14 @@ def get_lease_items():
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/lease-items/export', methods=['GET'])
+def export_lease_items():
+    # Streams the whole catalog; ?format=ndjson (default) or json
+    try:
+        return export_response(db.lease_items.find({}), request.args.get('format', 'ndjson'), 'lease_items')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 @app.route('/api/lease-items', methods=['POST'])
 @token_required
 def add_lease_item(current_user):
@@ -1412,6 +2114,10 @@ def add_lease_item(current_user):
         for field in required_fields:
             if field not in data:
                 return jsonify({"error": f"Missing required field: {field}"}), 400
+        try:
+            geo = lease_item_geo(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         # Get the contact info from user or use a fallback
         owner_name = current_user.get('fullname', 'Equipment Owner')
@@ -1438,6 +2144,8 @@ def add_lease_item(current_user):
             "ownerContact": owner_contact,
             "createdAt": datetime.now()
         }
+        if geo:
+            new_item["geo"] = geo
         
         print(f"Creating lease item with owner: {owner_name}, contact: {owner_contact}")
         
@@ -1460,6 +2168,8 @@ def add_lease_item(current_user):
             "ownerId": str(new_item["ownerId"]),
             "createdAt": new_item["createdAt"].isoformat()
         }
+        if geo:
+            response_data["geo"] = geo
         
         return jsonify({
             "status": "success",
@@ -1515,12 +2225,25 @@ def update_lease_item(current_user, item_id):
         for field in allowed_fields:
             if field in data:
                 update_data[field] = data[field]
-                
-        if update_data:
+        update = {"$set": update_data}
+
+        # Keep the coordinates in step with the location text or new coordinates
+        if any(field in data for field in ('location', 'latitude', 'longitude')):
+            try:
+                geo = lease_item_geo({**item, **data})
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            if geo:
+                update_data['geo'] = geo
+            else:
+                update["$unset"] = {"geo": ""}
+
+        if update_data or "$unset" in update:
             update_data['updatedAt'] = datetime.now()
+
             db.lease_items.update_one(
                 {"_id": ObjectId(item_id)},
-                {"$set": update_data}
+                update
             )
             
         # Get updated item
@@ -1652,6 +2375,9 @@ def seed_demo_data():
                 }
             ]
             
+            for item in demo_items:
+                item["geo"] = geo_point(item["location"])
+
             # Insert demo items
             db.lease_items.insert_many(demo_items)
             print(f"Added {len(demo_items)} demo items to the database")
@@ -1662,16 +2388,12 @@ def seed_demo_data():
         import traceback
         traceback.print_exc()
 
-#  Get Groq API key from environment variables
-GROQ_API_KEY = config('GROQ_API_KEY')
-
-# Load the model
-try:
-    model = joblib.load("./models/adaboost_model_soil.pkl")
-    print("Model loaded successfully")
-except Exception as e:
-    print(f"Error loading model: {e}")
-    model = None
+# Load every model artifact once so requests get warm handles
+def load_model_artifacts():
+    errors = [name for name, error in registry.load_all().items() if error]
+    if errors:
+        raise RuntimeError(f"Failed to load model artifacts: {', '.join(errors)}")
+    return registry.loaded()
 
 # Function to get insights from Groq
 def get_groq_insights(soil_params, soil_type, location, land_area, model_name="llama3-70b-8192"):
@@ -1723,30 +2445,18 @@ def get_groq_insights(soil_params, soil_type, location, land_area, model_name="l
     """
     
     try:
-        # Prepare the API request for Groq
-        url = "https://api.groq.com/openai/v1/chat/completions"
-        
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": model_name,
-            "messages": [
+        # Call Groq API
+        chat_completion = llm.groq_chat(
+            model=model_name,
+            messages=[
                 {"role": "system", "content": "You are an expert agricultural advisor with deep knowledge of soil science, crop selection, and sustainable farming practices."},
                 {"role": "user", "content": prompt}
             ],
-            "response_format": {"type": "json_object"}
-        }
-        
-        # Call Groq API
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
+            response_format={"type": "json_object"}
+        )
         
         # Parse the response
-        response_data = response.json()
-        content = response_data["choices"][0]["message"]["content"]
+        content = chat_completion.choices[0].message.content
         insights = json.loads(content)
         return insights, None
     
@@ -1761,39 +2471,56 @@ def predict_fertilizer():
     try:
         data = request.get_json()
 
-        required_fields = ['Temperature', 'Humidity', 'Soil Moisture', 'Soil Type',
-                           'Crop Type', 'Nitrogen', 'Potassium', 'Phosphorus']
-
-        if not all(field in data for field in required_fields):
+        if not data or not all(field in data for field in FERTILIZER_FEATURES):
             return jsonify({'error': 'Missing required fields'}), 400
-        soil_encoder = joblib.load("../models/soil_type_encoder.pkl")
-        crop_encoder = joblib.load("../models/crop_type_encoder.pkl")
-        fertilizer_encoder = joblib.load("../models/fertilizer_encoder.pkl")
 
-        # Transform categorical features
-        soil_type_encoded = soil_encoder.transform([data['Soil Type']])[0]
-        crop_type_encoded = crop_encoder.transform([data['Crop Type']])[0]
+        result = predict_fertilizers(pd.DataFrame([data]))[0]
+        if 'error' in result:
+            return jsonify(result), 400
+
+        return jsonify(result)
 
-        # Prepare input data
-        input_data = pd.DataFrame([{
-            'Temperature': float(data['Temperature']),
-            'Humidity': float(data['Humidity']),
-            'Soil Moisture': float(data['Soil Moisture']),
-            'Soil Type': soil_type_encoded,
-            'Crop Type': crop_type_encoded,
-            'Nitrogen': int(data['Nitrogen']),
-            'Potassium': int(data['Potassium']),
-            'Phosphorus': int(data['Phosphorus']),
-        }])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        xgb = joblib.load('../models/xgb_fertilizer_model.pkl')
-        pred = xgb.predict(input_data)
 
-        
+MAX_FERTILIZER_BATCH = 10000
 
+@app.route('/api/predict-fertilizer/batch', methods=['POST'])
+def predict_fertilizer_batch():
+    """
+    Recommend fertilizers for many soil tests in one call.
+
+    Accepts either a JSON array of samples (or {"samples": [...]}) or a CSV
+    upload in the "file" field shaped like datasets/fertilizer.csv. Extra
+    columns such as Fertilizer are ignored.
+    """
+    try:
+        if 'file' in request.files:
+            samples = pd.read_csv(request.files['file'])
+        else:
+            data = request.get_json(silent=True)
+            if isinstance(data, dict):
+                data = data.get('samples')
+            if not isinstance(data, list):
+                return jsonify({'error': 'Expected a JSON array of samples or a CSV file'}), 400
+            samples = pd.DataFrame(data)
+
+        if samples.empty:
+            return jsonify({'error': 'No samples provided'}), 400
+        if len(samples) > MAX_FERTILIZER_BATCH:
+            return jsonify({'error': f'At most {MAX_FERTILIZER_BATCH} samples per batch'}), 400
+
+        missing = [col for col in FERTILIZER_FEATURES if col not in samples.columns]
+        if missing:
+            return jsonify({'error': f'Missing fields: {", ".join(missing)}'}), 400
+
+        results = predict_fertilizers(samples)
         return jsonify({
-            'recommended_fertilizer' : pred
-        })
+            'count': len(results),
+            'failed': sum(1 for r in results if 'error' in r),
+            'results': results
+        }), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1801,7 +2528,57 @@ def predict_fertilizer():
 
 # farmwers activity via mobile
 
+def categorize_activity_text(text: str) -> dict:
+    """
+    Ask the LLM to turn a free-text activity into structured fields
+
+    Raises:
+        json.JSONDecodeError: if the model doesn't return valid JSON
+    """
+    prompt = f"""
+    Categorize the following agricultural text input and extract structured activity details:
+
+    "{text}"
+
+    As an intelligent agricultural assistant, analyze the user's input and generate a structured JSON object with the following keys:
+    {{
+        "activity_type": "Category of the activity (e.g., Harvesting, Sowing, Irrigation, Fertilization, Expense, etc.)",
+        "activity_name": "Short name or title of the activity",
+        "summary": "Brief summary or explanation of the activity described in the input",
+        "amount": "Extracted amount involved in the activity, if mentioned (in numeric form without currency symbol)"
+    }}
+
+    Please strictly return only the valid JSON. No extra explanation, no surrounding text — only a clean JSON object.
+    """
+
+    # Make the chat completion request
+    chat_completion = llm.groq_chat(
+        model="llama3-70b-8192",  # Correct model ID
+        messages=[
+            {"role": "system", "content": "You are an intelligent agricultural assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.5,
+        max_tokens=1024,
+        top_p=1.0
+    )
+
+    # Extract and parse JSON response
+    detailed_info = chat_completion.choices[0].message.content.strip()
+    return json.loads(detailed_info)
+
+def build_mobile_activity(activity_data: dict, user_id: ObjectId, yield_id: ObjectId) -> dict:
+    return {
+        'userId': user_id,
+        'yieldId': yield_id,
+        'activity_name': activity_data.get("activity_name"),
+        'activity_type': activity_data.get("activity_type"),
+        'summary': activity_data.get("summary"),
+        'amount': float(activity_data.get("amount", 0))
+    }
+
 @app.route('/api/mobile-activity', methods=['POST'])
+@async_job("mobile_activity")
 def mobile_activity():
     data = request.get_json()
     required_fields = ['mobileno', 'yield_id', 'text']
@@ -1829,51 +2606,11 @@ def mobile_activity():
     except Exception as e:
         return jsonify({'message': f'Failed to retrieve user/yield: {str(e)}'}), 500
 
-    prompt = f"""
-    Categorize the following agricultural text input and extract structured activity details:
-
-    "{text}"
-
-    As an intelligent agricultural assistant, analyze the user's input and generate a structured JSON object with the following keys:
-    {{
-        "activity_type": "Category of the activity (e.g., Harvesting, Sowing, Irrigation, Fertilization, Expense, etc.)",
-        "activity_name": "Short name or title of the activity",
-        "summary": "Brief summary or explanation of the activity described in the input",
-        "amount": "Extracted amount involved in the activity, if mentioned (in numeric form without currency symbol)"
-    }}
-
-    Please strictly return only the valid JSON. No extra explanation, no surrounding text — only a clean JSON object.
-    """
-
     try:
-        # Initialize Groq client
-        client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-
-        # Make the chat completion request
-        chat_completion = client.chat.completions.create(
-            model="llama3-70b-8192",  # Correct model ID
-            messages=[
-                {"role": "system", "content": "You are an intelligent agricultural assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.5,
-            max_tokens=1024,
-            top_p=1.0
-        )
-
-        # Extract and parse JSON response
-        detailed_info = chat_completion.choices[0].message.content.strip()
-        activity_data = json.loads(detailed_info)
+        activity_data = categorize_activity_text(text)
 
         # Save activity
-        activities_collection.insert_one({
-            'userId': user['_id'],
-            'yieldId': yieldObj['_id'],
-            'activity_name': activity_data.get("activity_name"),
-            'activity_type': activity_data.get("activity_type"),
-            'summary': activity_data.get("summary"),
-            'amount': float(activity_data.get("amount", 0))
-        })
+        activities_collection.insert_one(build_mobile_activity(activity_data, user['_id'], yieldObj['_id']))
 
         return jsonify({'message': 'Activity created successfully'}), 201
 
@@ -1882,13 +2619,65 @@ def mobile_activity():
     except Exception as e:
         return jsonify({'message': f'Failed to create activity: {str(e)}'}), 500
 
+# Offline sync of free-text activities. Users and yields are resolved in
+# bulk, the LLM categorizations run on BULK_LLM_WORKERS threads, and all
+# activities are written with one insert_many.
+@app.route('/api/mobile-activity/bulk', methods=['POST'])
+@async_job("mobile_activity_bulk")
+def mobile_activity_bulk():
+    try:
+        items = read_activity_batch()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if len(items) > MAX_SYNC_LLM_BATCH and not wants_async():
+        return jsonify({"error": f"Batches of more than {MAX_SYNC_LLM_BATCH} activities must be submitted with ?async=1"}), 400
+
+    results = {}
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or not all(field in item for field in ['mobileno', 'yield_id', 'text']):
+            results[i] = {"index": i, "status": "error", "error": "Missing required fields"}
+        elif not isinstance(item['text'], str):
+            results[i] = {"index": i, "status": "error", "error": "'text' must be a string"}
+        elif not isinstance(item['mobileno'], (str, int)) or not item['text'].strip():
+            results[i] = {"index": i, "status": "error", "error": "No activity added"}
+
+    try:
+        owners = resolve_activity_owners(items, results)
+    except Exception as e:
+        return jsonify({"error": f"Failed to retrieve users/yields: {str(e)}"}), 500
+
+    def categorize(i):
+        try:
+            return i, categorize_activity_text(items[i]['text'].strip()), None
+        except json.JSONDecodeError:
+            return i, None, "Invalid response format from AI model"
+        except Exception as e:
+            return i, None, f"Failed to categorize activity: {str(e)}"
+
+    activities = {}
+    workers = max(1, min(BULK_LLM_WORKERS, llm.max_concurrency - 1))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i, activity_data, error in executor.map(categorize, owners):
+            if error:
+                results[i] = {"index": i, "status": "error", "error": error}
+                continue
+            try:
+                activities[i] = build_mobile_activity(activity_data, *owners[i])
+            except (TypeError, ValueError) as e:
+                results[i] = {"index": i, "status": "error", "error": f"Invalid amount from AI model: {str(e)}"}
+
+    try:
+        insert_activities(activities, results)
+    except Exception as e:
+        return jsonify({"error": f"Failed to create activities: {str(e)}"}), 500
+
+    return bulk_activity_response(results, len(items))
 
-# Call the seed function at startup
-seed_demo_data()
 
 # ------------------ Cost Reduction Suggestions API ------------------
 @app.route('/api/cost-reduction-suggestions', methods=['POST'])
 @token_required
+@async_job("cost_reduction_suggestions")
 def get_cost_reduction_suggestions(current_user):
     try:
         print("Received cost reduction suggestion request")
@@ -1983,9 +2772,6 @@ def get_cost_reduction_suggestions(current_user):
             
             print(f"Using Gemini API key (first few chars): {api_key[:5]}...")
             
-            # Configure the Gemini API
-            genai.configure(api_key=api_key)
-            
             # Set up the model
             generation_config = {
                 "temperature": 0.2,
@@ -1993,14 +2779,8 @@ def get_cost_reduction_suggestions(current_user):
                 "top_k": 40,
             }
             
-            # Initialize the model
-            model = genai.GenerativeModel(
-                model_name="gemini-1.5-flash",
-                generation_config=generation_config
-            )
-            
             print("Making request to Gemini API using Python client")
-            response = model.generate_content(prompt)
+            response = llm.gemini_generate(prompt, model_name="gemini-1.5-flash", generation_config=generation_config)
             
             if not response:
                 print("Empty response from Gemini API")
@@ -2063,6 +2843,56 @@ def get_cost_reduction_suggestions(current_user):
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+def backfill_lease_item_geo():
+    # Geocode lease items stored before coordinates were recorded
+    updated = 0
+    for item in db.lease_items.find({"geo": {"$exists": False}}, {"location": 1}):
+        geo = geo_point(item.get("location", ""))
+        if geo:
+            db.lease_items.update_one({"_id": item["_id"]}, {"$set": {"geo": geo}})
+            updated += 1
+    print(f"Geocoded {updated} lease items")
+    return updated
+
+# ------------------ Startup / Health ------------------
+# Slow subsystems, warmed according to STARTUP_MODE (eager, background or lazy)
+warmup.register("mongo", ping_db)
+warmup.register("indexes", ensure_indexes)
+warmup.register("demo_data", seed_demo_data)
+warmup.register("lease_item_geo", backfill_lease_item_geo)
+warmup.register("market_catalog", load_catalog, on_demand=True)
+warmup.register("market_index", lambda: MarketIndex(get_market_catalog().states), on_demand=True)
+warmup.register("models", load_model_artifacts, on_demand=True)
+warmup.register("plant_disease", lambda: importlib.import_module("plant_disease_model"), on_demand=True)
+if chat_embedder.name == "transformer":
+    warmup.register("chat_embedder", chat_embedder.load, on_demand=True)
+warmup.start()
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    return jsonify({"status": "ok"}), 200
+
+@app.route('/api/chat/cache/stats', methods=['GET'])
+def chat_cache_stats():
+    return jsonify({
+        "embedder": chat_embedder.name,
+        "exact": chat_exact_cache.stats(),
+        "semantic": chat_semantic_cache.stats()
+    }), 200
+
+@app.route('/api/llm/stats', methods=['GET'])
+def llm_stats():
+    return jsonify(llm.stats()), 200
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness():
+    ready = warmup.ready()
+    return jsonify({
+        "ready": ready,
+        "startup_mode": STARTUP_MODE,
+        "subsystems": warmup.status()
+    }), 200 if ready else 503
+
 # ------------------ Run App ------------------
 if __name__ == '__main__':
     app.run(debug=True)
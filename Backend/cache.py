@@ -0,0 +1,373 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with optional per-entry expiry and on-disk backing.
+
+    Entries are evicted least-recently-used first once max_entries is reached,
+    and are treated as missing once older than ttl_seconds (None keeps them
+    until evicted). When disk_dir is set, values are also written there as
+    JSON so they survive restarts; values must then be JSON serializable.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None,
+                 disk_dir: Optional[str] = None, name: str = "cache"):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds
+
+    def _disk_path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.json")
+
+    def _read_disk(self, key: str):
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get("key") != key or self._expired(record["stored_at"]):
+            return None
+        return record["stored_at"], record["value"]
+
+    def _write_disk(self, key: str, stored_at: float, value: Any):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "stored_at": stored_at, "value": value}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error writing {self.name} entry to disk: {str(e)}")
+
+    def _store(self, key: str, stored_at: float, value: Any):
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+            entry = self._read_disk(key) if self.disk_dir else None
+            if entry is None:
+                self._misses += 1
+                return default
+
+            self._store(key, *entry)
+            self._hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any):
+        stored_at = time.time()
+        with self._lock:
+            self._store(key, stored_at, value)
+        if self.disk_dir:
+            self._write_disk(key, stored_at, value)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.disk_dir:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def get_or_set(self, key: str, compute) -> Any:
+        """Return the cached value, computing and storing it on a miss"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0,
+            }
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into a single call.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, Future] = {}
+
+    def do(self, key: Any, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class StaleWhileRevalidateCache:
+    """
+    Cache in front of a slow fetch function with single-flight loading.
+
+    Entries younger than ttl_seconds are served as is. Entries older than that
+    but within stale_seconds more are still served, while one background
+    refresh replaces them. Anything older, or missing, is fetched on the
+    caller's thread, with concurrent callers for the same key sharing one
+    fetch. Failed fetches are not cached.
+    """
+
+    def __init__(self, fetch: Callable[..., Any], ttl_seconds: float, stale_seconds: float = 0,
+                 max_entries: int = 1024, name: str = "cache"):
+        self.fetch = fetch
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self.name = name
+        self._entries = OrderedDict()  # key -> (fetched_at, value)
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._refreshing = set()
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._fetches = 0
+
+    def _load(self, key: Any) -> Any:
+        def fetch():
+            value = self.fetch(*key) if isinstance(key, tuple) else self.fetch(key)
+            with self._lock:
+                self._fetches += 1
+                self._entries[key] = (time.time(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return value
+        return self._flight.do(key, fetch)
+
+    def _refresh(self, key: Any):
+        try:
+            self._load(key)
+        except Exception as e:
+            print(f"Error refreshing {self.name} entry {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, key: Any) -> Any:
+        """Return the value for key, fetching it if missing or too old. Tuple keys are passed to fetch as arguments."""
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.time() - entry[0] if entry else None
+
+            if entry and age <= self.ttl_seconds:
+                self._hits += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+
+            if entry and age <= self.ttl_seconds + self.stale_seconds:
+                self._stale_hits += 1
+                if key not in self._refreshing:
+                    self._refreshing.add(key)
+                    threading.Thread(target=self._refresh, args=(key,), daemon=True).start()
+                return entry[1]
+
+            self._misses += 1
+
+        return self._load(key)
+
+    def invalidate(self, key: Any):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "ttl_seconds": self.ttl_seconds,
+                "stale_seconds": self.stale_seconds,
+                "hits": self._hits,
+                "stale_hits": self._stale_hits,
+                "misses": self._misses,
+                "upstream_fetches": self._fetches,
+            }
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache over unit-length embeddings.
+
+    A lookup returns the stored value whose embedding has the highest cosine
+    similarity to the query, if it reaches threshold. Only entries with the
+    same partition (any hashable, e.g. model and sampling settings) are
+    compared. Vectors live in one preallocated NumPy matrix and each slot's
+    partition is an integer id in a NumPy array, so a lookup is a single
+    matrix-vector product plus vectorized masks. The matrix is allocated
+    when the first entry is stored. When
+    full, the least recently used entry is replaced; entries older than
+    ttl_seconds are ignored and reclaimed first.
+    """
+
+    def __init__(self, embed: Callable[[str], Any], threshold: float = 0.9,
+                 max_entries: int = 1024, ttl_seconds: Optional[float] = None, name: str = "semantic_cache"):
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._vectors = None
+        # Partition -> id, and each id's partition and number of slots using it
+        self._partition_ids: Dict[Any, int] = {}
+        self._partition_keys: Dict[int, Any] = {}
+        self._partition_refs: Dict[int, int] = {}
+        self._next_partition_id = 0
+        self._slot_partitions = np.full(max_entries, -1, dtype=np.int64)  # -1: no entry
+        self._values = [None] * max_entries
+        self._stored_at = np.zeros(max_entries)
+        self._used_at = np.full(max_entries, -np.inf)  # -inf marks a free slot
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _live(self):
+        live = self._used_at > -np.inf
+        if self.ttl_seconds is not None:
+            live &= time.time() - self._stored_at <= self.ttl_seconds
+        return live
+
+    def get(self, text: str, partition: Any = None, vector=None):
+        """
+        Return (value, similarity) for the closest cached entry, or (None, best similarity)
+
+        Pass vector to reuse an embedding already computed for text.
+        """
+        query = self.embed(text) if vector is None else vector
+        with self._lock:
+            partition_id = self._partition_ids.get(partition)
+            if partition_id is None or self._vectors is None:
+                self._misses += 1
+                return None, 0.0
+            candidates = self._live() & (self._slot_partitions == partition_id)
+            if not candidates.any():
+                self._misses += 1
+                return None, 0.0
+            similarities = np.where(candidates, self._vectors @ query, -np.inf)
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self._misses += 1
+                return None, similarity
+            self._hits += 1
+            self._used_at[best] = time.time()
+            return self._values[best], similarity
+
+    def _assign_partition(self, slot: int, partition: Any):
+        """Point slot at partition's id, dropping the old partition's id once unused"""
+        old_id = int(self._slot_partitions[slot])
+        if old_id >= 0:
+            self._partition_refs[old_id] -= 1
+            if not self._partition_refs[old_id]:
+                del self._partition_refs[old_id]
+                del self._partition_ids[self._partition_keys.pop(old_id)]
+
+        partition_id = self._partition_ids.get(partition)
+        if partition_id is None:
+            partition_id = self._next_partition_id
+            self._next_partition_id += 1
+            self._partition_ids[partition] = partition_id
+            self._partition_keys[partition_id] = partition
+        self._partition_refs[partition_id] = self._partition_refs.get(partition_id, 0) + 1
+        self._slot_partitions[slot] = partition_id
+
+    def set(self, text: str, value: Any, partition: Any = None, vector=None):
+        vector = self.embed(text) if vector is None else vector
+        now = time.time()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            live = self._live()
+            if not live.all():
+                slot = int(np.argmin(live))  # a free or expired slot
+            else:
+                slot = int(np.argmin(self._used_at))
+                self._evictions += 1
+            self._vectors[slot] = vector
+            self._assign_partition(slot, partition)
+            self._values[slot] = value
+            self._stored_at[slot] = now
+            self._used_at[slot] = now
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "name": self.name,
+                "entries": int(self._live().sum()),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "threshold": self.threshold,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0,
+            }
@@ -0,0 +1,35 @@
+import pandas as pd
+
+from model_registry import registry
+
+CROP_MODEL = "crop_recommendation/crop_recommendation_model.pkl"
+CROP_SCALER = "crop_recommendation/minmaxscaler_crop_recommendation.pkl"
+
+# Feature order the scaler and random forest were fitted on
+CROP_FEATURES = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+
+
+def recommend_crops(params: dict, top_k: int = 5) -> list:
+    """
+    Rank crops for the given soil and climate readings with the bundled random forest
+
+    Args:
+        params: Dictionary with the CROP_FEATURES keys
+        top_k: Number of crops to return
+
+    Returns:
+        List of {"crop": ..., "probability": ...} dicts, best first
+    """
+    model, scaler = registry.get_many(CROP_MODEL, CROP_SCALER)
+
+    columns = list(getattr(scaler, "feature_names_in_", CROP_FEATURES))
+    sample = pd.DataFrame([{col: float(params[col]) for col in columns}], columns=columns)
+    scaled = scaler.transform(sample)
+
+    probabilities = model.predict_proba(scaled)[0]
+    ranked = sorted(zip(model.classes_, probabilities), key=lambda x: x[1], reverse=True)
+
+    return [
+        {"crop": str(crop), "probability": round(float(probability), 4)}
+        for crop, probability in ranked[:top_k]
+    ]
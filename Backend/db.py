@@ -13,14 +13,21 @@ except Exception as e:
     MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/shetniyojan")
     print(f"Using default MongoDB URI: {MONGO_URI}")
 
+# Outside eager startup the connection is checked by the warm-up thread
+# instead of blocking the import with a ping
+LAZY_CONNECT = os.environ.get("STARTUP_MODE", "eager").lower() != "eager"
+
+USING_FAKE_DB = False
+
 # Create client with a timeout to avoid hanging
 try:
     print(f"Connecting to MongoDB using pymongo {pymongo.__version__}")
     client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
     
     # Test the connection
-    client.admin.command('ping')
-    print("Successfully connected to MongoDB")
+    if not LAZY_CONNECT:
+        client.admin.command('ping')
+        print("Successfully connected to MongoDB")
 except Exception as e:
     print(f"Error connecting to MongoDB: {str(e)}")
     print("Using temporary in-memory database for development")
@@ -50,6 +57,7 @@ except Exception as e:
             return FakeDB()
             
     client = FakeClient()
+    USING_FAKE_DB = True
 
 db = client['shetniyojan']
 
@@ -57,11 +65,81 @@ users_collection = db['users']
 tasks_collection = db['tasks']
 yields_collection = db['yields']
 activities_collection = db['activities']
-# Ensure the lease_items collection exists
-try:
-    db.lease_items.create_index("name")
-    print("Lease items collection initialized")
-except Exception as e:
-    print(f"Error creating index on lease_items: {str(e)}")
-    # Continue without creating the index
 
+def ping():
+    if USING_FAKE_DB:
+        raise RuntimeError("Not connected to MongoDB, using temporary in-memory database")
+    client.admin.command('ping')
+    return True
+
+# Seconds an LLM job document is kept after creation
+LLM_JOB_TTL = int(os.environ.get("LLM_JOB_TTL", str(24 * 3600)))
+
+# Indexes per collection, applied at startup by ensure_indexes().
+# Keep in sync with the query shapes audited in index_audit.py.
+INDEX_SPECS = {
+    "users": [
+        {"keys": [("mobileno", pymongo.ASCENDING)]},
+        {"keys": [("token", pymongo.ASCENDING)]},
+    ],
+    "yields": [
+        {"keys": [("userId", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]},
+    ],
+    "activities": [
+        {"keys": [("userId", pymongo.ASCENDING), ("yieldId", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]},
+    ],
+    "lease_items": [
+        {"keys": [("name", pymongo.ASCENDING)]},
+        {"keys": [("location", pymongo.ASCENDING)]},
+        # Marketplace search: equality filters first, then the price sort/range
+        {"keys": [("category", pymongo.ASCENDING), ("available", pymongo.ASCENDING),
+                  ("pricePerHour", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]},
+        {"keys": [("available", pymongo.ASCENDING), ("pricePerHour", pymongo.ASCENDING),
+                  ("_id", pymongo.ASCENDING)]},
+        {"keys": [("pricePerHour", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]},
+        # "near me" queries on the GeoJSON point derived from location
+        {"keys": [("geo", pymongo.GEOSPHERE), ("available", pymongo.ASCENDING)]},
+        {"keys": [("name", pymongo.TEXT), ("description", pymongo.TEXT)],
+         "options": {"weights": {"name": 3, "description": 1}, "name": "lease_items_text"}},
+    ],
+    "mandi_prices": [
+        {"keys": [("meta.commodity", pymongo.ASCENDING), ("meta.state", pymongo.ASCENDING),
+                  ("date", pymongo.DESCENDING)]},
+        {"keys": [("meta.arrival_date", pymongo.ASCENDING)]},
+    ],
+    "llm_jobs": [
+        # Job documents expire LLM_JOB_TTL seconds after creation
+        {"keys": [("createdAt", pymongo.ASCENDING)], "options": {"expireAfterSeconds": LLM_JOB_TTL}},
+    ],
+}
+
+# Collections that must be created as time-series before any index is built
+TIME_SERIES_COLLECTIONS = {
+    "mandi_prices": {"timeField": "date", "metaField": "meta", "granularity": "hours"},
+}
+
+def ensure_time_series():
+    existing = set(db.list_collection_names())
+    for collection_name, options in TIME_SERIES_COLLECTIONS.items():
+        if collection_name in existing:
+            continue
+        try:
+            db.create_collection(collection_name, timeseries=options)
+            print(f"Created time-series collection {collection_name}")
+        except Exception as e:
+            # Older servers: a regular collection with the same indexes still works
+            print(f"Error creating time-series collection {collection_name}: {str(e)}")
+
+def ensure_indexes():
+    try:
+        ensure_time_series()
+    except Exception as e:
+        print(f"Error checking time-series collections: {str(e)}")
+    for collection_name, specs in INDEX_SPECS.items():
+        try:
+            indexes = [pymongo.IndexModel(spec["keys"], **spec.get("options", {})) for spec in specs]
+            created = db[collection_name].create_indexes(indexes)
+            print(f"Indexes on {collection_name}: {created}")
+        except Exception as e:
+            print(f"Error creating indexes on {collection_name}: {str(e)}")
+            # Continue with the remaining collections
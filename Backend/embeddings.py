@@ -0,0 +1,136 @@
+"""
+Local text embeddings for near-duplicate detection.
+
+CHAT_EMBEDDER selects the backend:
+    hashing      hashed word and character n-gram counts (default, no model download)
+    transformer  mean-pooled sentence embeddings from CHAT_EMBEDDING_MODEL
+"""
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+CHAT_EMBEDDER = os.getenv("CHAT_EMBEDDER", "hashing").lower()
+CHAT_EMBEDDING_MODEL = os.getenv("CHAT_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+HASHING_DIMENSIONS = int(os.getenv("CHAT_EMBEDDING_DIMENSIONS", "2048"))
+
+# Words that carry no topic; dropping them keeps "how do I control aphids"
+# close to "control aphids"
+STOPWORDS = {
+    "a", "an", "and", "are", "can", "do", "does", "for", "how", "i", "in", "is", "it",
+    "me", "my", "of", "on", "or", "should", "the", "to", "what", "when", "which", "with",
+}
+
+# Words that change the answer while barely moving the embedding ("1 acre" vs
+# "10 acre", "irrigate" vs "not irrigate"). "t" is what's left of don't, can't etc.
+NEGATIONS = {"cannot", "dont", "never", "no", "nor", "not", "t", "without"}
+QUESTION_WORDS = {"how", "what", "when", "where", "which", "who", "why"}
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+def key_terms(text: str) -> tuple:
+    """
+    Numbers, negations and question words in text, sorted and deduplicated
+
+    Near-duplicate questions must have the same key terms, so a cached answer
+    is never reused for a different quantity or the opposite question.
+    """
+    words = set(normalize_text(text).split())
+    return tuple(sorted(w for w in words
+                        if any(c.isdigit() for c in w) or w in NEGATIONS or w in QUESTION_WORDS))
+
+
+def stem(word: str) -> str:
+    """Strip one common English suffix, so "aphids"/"aphid" and "controlling"/"control" agree"""
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            word = word[:-len(suffix)]
+            if len(word) > 3 and word[-1] == word[-2]:
+                word = word[:-1]
+            break
+    return word
+
+
+def content_terms(text: str) -> tuple:
+    """Stemmed words of text other than stopwords, sorted and deduplicated"""
+    return tuple(sorted({stem(w) for w in normalize_text(text).split() if w not in STOPWORDS}))
+
+
+class HashingEmbedder:
+    """
+    Bag of words plus character trigrams, hashed into a fixed-size unit vector.
+
+    Trigrams make plurals and small spelling differences ("aphid"/"aphids")
+    overlap; no model or network access is needed. A different content word
+    in a long question ("tomato"/"potato") barely changes the vector, so
+    similarity alone can't tell such questions apart (see content_terms).
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimensions: int = HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _features(self, text: str):
+        words = [w for w in normalize_text(text).split() if w not in STOPWORDS]
+        for word in words:
+            yield "w:" + word
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                yield "c:" + padded[i:i + 3]
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self._features(text):
+            vector[zlib.crc32(feature.encode("utf-8")) % self.dimensions] += 1.0
+        vector = np.log1p(vector)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class TransformerEmbedder:
+    """Mean-pooled embeddings from a Hugging Face encoder, loaded on first use"""
+
+    name = "transformer"
+
+    def __init__(self, model_name: str = CHAT_EMBEDDING_MODEL):
+        self.model_name = model_name
+        self._tokenizer = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from transformers import AutoModel, AutoTokenizer
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                    model = AutoModel.from_pretrained(self.model_name)
+                    model.eval()
+                    self._model = model
+        return self
+
+    def embed(self, text: str) -> np.ndarray:
+        import torch
+        self.load()
+        inputs = self._tokenizer(text, return_tensors="pt", truncation=True, max_length=256)
+        with torch.no_grad():
+            hidden = self._model(**inputs).last_hidden_state[0]
+        mask = inputs["attention_mask"][0].unsqueeze(-1).float()
+        vector = ((hidden * mask).sum(dim=0) / mask.sum()).numpy().astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+def build_embedder(name: str = CHAT_EMBEDDER):
+    if name == "transformer":
+        return TransformerEmbedder()
+    if name != "hashing":
+        print(f"Unknown CHAT_EMBEDDER '{name}', using hashing")
+    return HashingEmbedder()
@@ -0,0 +1,53 @@
+import json
+from typing import Iterator
+
+from flask import Response, stream_with_context
+
+from pagination import serialize_document
+
+# Documents fetched from Mongo per round-trip while streaming
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+
+def ndjson_lines(cursor) -> Iterator[str]:
+    """Yield one JSON document per line"""
+    for doc in cursor:
+        yield json.dumps(serialize_document(doc)) + "\n"
+
+
+def json_array_chunks(cursor) -> Iterator[str]:
+    """Yield a JSON array piece by piece without building it in memory"""
+    yield "["
+    first = True
+    for doc in cursor:
+        yield ("" if first else ",") + json.dumps(serialize_document(doc))
+        first = False
+    yield "]"
+
+
+def export_response(cursor, fmt: str = "ndjson", filename: str = "export") -> Response:
+    """
+    Stream a Mongo cursor to the client as NDJSON or a chunked JSON array
+
+    Memory use stays constant: the cursor is read EXPORT_BATCH_SIZE documents
+    at a time and each document is written out as soon as it is serialized.
+
+    Raises:
+        ValueError: if fmt is not one of EXPORT_FORMATS
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}. Use one of {', '.join(EXPORT_FORMATS)}")
+
+    cursor = cursor.batch_size(EXPORT_BATCH_SIZE)
+    body = ndjson_lines(cursor) if fmt == "ndjson" else json_array_chunks(cursor)
+    extension = "ndjson" if fmt == "ndjson" else "json"
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}.{extension}"}
+    )
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+from model_registry import registry
+
+# Feature columns in the order the XGBoost model was trained on (datasets/fertilizer.csv)
+FERTILIZER_FEATURES = ['Temperature', 'Humidity', 'Soil Moisture', 'Soil Type',
+                       'Crop Type', 'Nitrogen', 'Potassium', 'Phosphorus']
+CATEGORICAL_FEATURES = {
+    'Soil Type': 'soil_type_encoder.pkl',
+    'Crop Type': 'crop_type_encoder.pkl',
+}
+NUMERIC_FEATURES = [f for f in FERTILIZER_FEATURES if f not in CATEGORICAL_FEATURES]
+
+
+def predict_fertilizers(samples: pd.DataFrame) -> list:
+    """
+    Recommend a fertilizer for every row of a frame shaped like datasets/fertilizer.csv
+
+    Categorical columns are encoded with one vectorized encoder call each and the
+    model runs a single predict over every valid row. Rows with missing or
+    non-numeric values or unseen soil/crop types are reported instead of failing
+    the whole batch.
+
+    Args:
+        samples: DataFrame with at least the FERTILIZER_FEATURES columns
+
+    Returns:
+        List with one {"recommended_fertilizer": ...} or {"error": ...} dict per row
+    """
+    missing = [col for col in FERTILIZER_FEATURES if col not in samples.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    # Take one consistent set of handles for the whole batch
+    soil_encoder, crop_encoder, fertilizer_encoder, xgb = registry.get_many(
+        CATEGORICAL_FEATURES['Soil Type'],
+        CATEGORICAL_FEATURES['Crop Type'],
+        'fertilizer_encoder.pkl',
+        'xgb_fertilizer_model.pkl',
+    )
+    encoders = {'Soil Type': soil_encoder, 'Crop Type': crop_encoder}
+
+    samples = samples.reset_index(drop=True)
+    errors = pd.Series([None] * len(samples), dtype=object)
+
+    features = pd.DataFrame(index=samples.index)
+    for col in NUMERIC_FEATURES:
+        features[col] = pd.to_numeric(samples[col], errors='coerce').astype(float)
+        bad = features[col].isna() & errors.isna()
+        errors[bad] = f"Invalid value for {col}"
+
+    for col, encoder in encoders.items():
+        values = samples[col].astype(str).str.strip()
+        known = values.isin(encoder.classes_)
+        errors[~known & errors.isna()] = f"Unknown {col}"
+        encoded = np.zeros(len(samples), dtype=int)
+        if known.any():
+            encoded[known.to_numpy()] = encoder.transform(values[known])
+        features[col] = encoded
+
+    valid = errors.isna().to_numpy()
+    results = [{'error': error} if error else None for error in errors]
+    if valid.any():
+        preds = xgb.predict(features.loc[valid, FERTILIZER_FEATURES])
+        labels = fertilizer_encoder.inverse_transform(np.asarray(preds, dtype=int))
+        for idx, label in zip(np.flatnonzero(valid), labels):
+            results[idx] = {'recommended_fertilizer': str(label)}
+
+    return results
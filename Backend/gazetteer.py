@@ -0,0 +1,72 @@
+import csv
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+GAZETTEER_PATH = os.path.join(base_dir, "datasets", "india_places.csv")
+
+_places: Optional[Dict[str, dict]] = None
+_lock = threading.Lock()
+
+
+def normalize_place(name: str) -> str:
+    """Lowercase and collapse punctuation/whitespace so 'Nashik ' matches 'nashik'"""
+    return re.sub(r"[^a-z0-9]+", " ", (name or "").lower()).strip()
+
+
+def _load_places() -> Dict[str, dict]:
+    global _places
+    if _places is None:
+        with _lock:
+            if _places is None:
+                places = {}
+                with open(GAZETTEER_PATH, newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        places[normalize_place(row["name"])] = {
+                            "name": row["name"],
+                            "state": row["state"],
+                            "lat": float(row["latitude"]),
+                            "lng": float(row["longitude"]),
+                            "kind": row["kind"],
+                        }
+                _places = places
+    return _places
+
+
+def lookup(location: str) -> Optional[dict]:
+    """
+    Resolve a free-text location such as "Nashik, Maharashtra" to a known place
+
+    Each comma separated part is tried in order, so the most specific match
+    wins; a part that only names a state falls back to the state centroid.
+
+    Returns:
+        The gazetteer entry, or None if nothing matches
+    """
+    places = _load_places()
+    state_match = None
+    for part in (location or "").split(","):
+        place = places.get(normalize_place(part))
+        if place is None:
+            continue
+        if place["kind"] != "state":
+            return place
+        state_match = state_match or place
+    return state_match
+
+
+def geocode(location: str) -> Optional[Tuple[float, float]]:
+    """Return (lat, lng) for a free-text location, or None if unknown"""
+    place = lookup(location)
+    return (place["lat"], place["lng"]) if place else None
+
+
+def geo_point(location: str) -> Optional[dict]:
+    """Return a GeoJSON Point for a free-text location, or None if unknown"""
+    coords = geocode(location)
+    if coords is None:
+        return None
+    # GeoJSON order is [longitude, latitude]
+    return {"type": "Point", "coordinates": [coords[1], coords[0]]}
@@ -0,0 +1,100 @@
+"""
+Run explain() on every query shape app.py issues and flag collection scans.
+
+Usage:
+    python index_audit.py            # apply INDEX_SPECS first, then audit
+    python index_audit.py --no-apply # audit the indexes as they are
+
+Exits with status 1 if an unexpected COLLSCAN is found.
+"""
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+
+from db import db, ensure_indexes
+
+# (collection, filter, sort, description). Values are placeholders; only the
+# shape matters to the planner. allow_collscan marks deliberate full scans.
+QUERY_SHAPES = [
+    {"collection": "users", "filter": {"token": "token"}, "description": "token_required"},
+    {"collection": "users", "filter": {"mobileno": "9999999999"}, "description": "login / register / activity lookups"},
+    {"collection": "yields", "filter": {"userId": ObjectId(), "_id": {"$gt": ObjectId()}},
+     "sort": [("_id", 1)], "limit": 101, "description": "get_yields (paged)"},
+    {"collection": "yields", "filter": {"_id": ObjectId(), "userId": ObjectId()}, "description": "yield ownership check"},
+    {"collection": "activities", "filter": {"userId": ObjectId(), "yieldId": ObjectId(), "_id": {"$lt": ObjectId()}},
+     "sort": [("_id", -1)], "limit": 101, "description": "get_activities (paged)"},
+    {"collection": "lease_items", "filter": {"_id": ObjectId()}, "description": "get/update/delete lease item"},
+    {"collection": "lease_items", "filter": {"category": "Tractor", "available": True},
+     "sort": [("pricePerHour", 1), ("_id", 1)], "limit": 101, "description": "marketplace search by category"},
+    {"collection": "lease_items", "filter": {"available": True, "pricePerHour": {"$gte": 100, "$lte": 500}},
+     "sort": [("pricePerHour", 1), ("_id", 1)], "limit": 101, "description": "marketplace search by price"},
+    {"collection": "lease_items", "filter": {"$text": {"$search": "tractor"}}, "limit": 101,
+     "description": "marketplace text search"},
+    {"collection": "lease_items", "filter": {"category": "Tractor", "$text": {"$search": "tractor"}}, "limit": 101,
+     "description": "marketplace text search in category"},
+    {"collection": "lease_items", "filter": {"location": "Nashik, Maharashtra"}, "description": "lease items by location"},
+    {"collection": "lease_items", "filter": {"available": True, "geo": {"$nearSphere": {
+        "$geometry": {"type": "Point", "coordinates": [73.79, 19.99]}, "$maxDistance": 50000}}},
+     "limit": 100, "description": "lease items near a point"},
+    {"collection": "lease_items", "filter": {}, "sort": [("_id", 1)], "limit": 101,
+     "description": "get_lease_items (unfiltered page)"},
+    {"collection": "lease_items", "filter": {}, "description": "lease items export", "allow_collscan": True},
+    {"collection": "mandi_prices", "filter": {"meta.commodity": "Onion", "meta.state": "Maharashtra",
+                                              "date": {"$gte": datetime(2024, 1, 1)}},
+     "sort": [("date", -1)], "description": "latest mandi prices"},
+    {"collection": "mandi_prices", "filter": {"meta.arrival_date": "2024-01-01"}, "description": "mandi ingest day replace"},
+]
+
+
+def find_stages(plan, stage: str) -> bool:
+    """Return True if the stage appears anywhere in an explain plan tree"""
+    if isinstance(plan, dict):
+        if plan.get("stage") == stage:
+            return True
+        return any(find_stages(value, stage) for value in plan.values())
+    if isinstance(plan, list):
+        return any(find_stages(value, stage) for value in plan)
+    return False
+
+
+def audit(shapes: list = QUERY_SHAPES) -> list:
+    """
+    Explain each query shape and report whether the winning plan scans the collection
+
+    Returns:
+        List of result dicts, one per shape
+    """
+    results = []
+    for shape in shapes:
+        cursor = db[shape["collection"]].find(shape["filter"])
+        if shape.get("sort"):
+            cursor = cursor.sort(shape["sort"])
+        if shape.get("limit"):
+            cursor = cursor.limit(shape["limit"])
+
+        winning_plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        collscan = find_stages(winning_plan, "COLLSCAN")
+        results.append({
+            "collection": shape["collection"],
+            "description": shape["description"],
+            "collscan": collscan,
+            "flagged": collscan and not shape.get("allow_collscan", False),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    if "--no-apply" not in sys.argv:
+        ensure_indexes()
+
+    flagged = 0
+    for result in audit():
+        status = "COLLSCAN" if result["collscan"] else "ok"
+        if result["flagged"]:
+            flagged += 1
+            status += "  <-- needs an index"
+        print(f"{result['collection']:<12} {result['description']:<45} {status}")
+
+    print(f"{flagged} unexpected collection scan(s)")
+    sys.exit(1 if flagged else 0)
@@ -0,0 +1,111 @@
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from cache import TTLCache
+from db import LLM_JOB_TTL
+
+LLM_JOB_WORKERS = int(os.getenv("LLM_JOB_WORKERS", "4"))
+# Jobs queued or running at once; submissions beyond this are refused
+LLM_JOB_MAX_PENDING = int(os.getenv("LLM_JOB_MAX_PENDING", "100"))
+# Longest a poll may block waiting for a job to finish
+MAX_JOB_WAIT_SECONDS = 30
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when LLM_JOB_MAX_PENDING jobs are already queued or running"""
+
+
+class JobQueue:
+    """
+    Runs slow calls on a bounded thread pool and records their outcome.
+
+    Job documents are written to a Mongo collection (expired by its TTL
+    index, see db.INDEX_SPECS) so any process can answer a poll, and are
+    mirrored in memory so this process can answer without a round-trip and
+    long-poll until completion.
+    """
+
+    def __init__(self, collection, max_workers: int = LLM_JOB_WORKERS,
+                 max_pending: int = LLM_JOB_MAX_PENDING, ttl_seconds: float = LLM_JOB_TTL):
+        self.collection = collection
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-job")
+        self._local = TTLCache(max_entries=max(1000, max_pending * 10), ttl_seconds=ttl_seconds, name="llm_jobs")
+        self._done_events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._counts = {"submitted": 0, "done": 0, "error": 0, "rejected": 0}
+
+    def _save(self, job: dict, **fields):
+        job.update(fields)
+        self._local.set(job["_id"], job)
+        try:
+            self.collection.replace_one({"_id": job["_id"]}, job, upsert=True)
+        except Exception as e:
+            print(f"Error saving job {job['_id']}: {str(e)}")
+
+    def submit(self, kind: str, fn: Callable[[], Tuple[Any, int]], owner: Optional[str] = None) -> str:
+        """
+        Queue fn and return the job id straight away
+
+        fn returns (result body, HTTP status code). owner, if given, is stored
+        with the job so callers can check who may read the result.
+
+        Raises:
+            JobQueueFullError: if too many jobs are already pending
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._counts["rejected"] += 1
+                raise JobQueueFullError(f"Too many pending jobs (limit {self.max_pending}), try again later")
+            self._pending += 1
+            self._counts["submitted"] += 1
+
+        job_id = uuid.uuid4().hex
+        job = {"_id": job_id, "kind": kind, "owner": owner, "status": "queued", "createdAt": datetime.utcnow()}
+        self._done_events[job_id] = threading.Event()
+        self._save(job)
+        self._executor.submit(self._run, job, fn)
+        return job_id
+
+    def _run(self, job: dict, fn: Callable[[], Tuple[Any, int]]):
+        outcome = "error"
+        self._save(job, status="running", startedAt=datetime.utcnow())
+        try:
+            result, status_code = fn()
+            self._save(job, status="done", result=result, statusCode=status_code, finishedAt=datetime.utcnow())
+            outcome = "done"
+        except Exception as e:
+            print(f"Job {job['_id']} ({job['kind']}) failed: {str(e)}")
+            self._save(job, status="error", error=str(e), statusCode=500, finishedAt=datetime.utcnow())
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._counts[outcome] += 1
+            event = self._done_events.pop(job["_id"], None)
+            if event:
+                event.set()
+
+    def get(self, job_id: str, wait: float = 0) -> Optional[dict]:
+        """
+        Return the job document, or None if unknown or expired
+
+        With wait > 0, block up to that many seconds (at most
+        MAX_JOB_WAIT_SECONDS) for a job running in this process to finish.
+        """
+        event = self._done_events.get(job_id)
+        if event is not None and wait > 0:
+            event.wait(min(wait, MAX_JOB_WAIT_SECONDS))
+
+        job = self._local.get(job_id)
+        if job is None:
+            job = self.collection.find_one({"_id": job_id})
+        return dict(job) if job else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"pending": self._pending, "max_pending": self.max_pending, **self._counts}
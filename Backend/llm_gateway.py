@@ -0,0 +1,174 @@
+"""
+Shared clients for the Groq and Gemini APIs.
+
+Every LLM call in the app goes through the module-level `llm` gateway, so
+connections (and their TLS sessions) are pooled and reused across requests,
+each provider has its own timeout, and the number of concurrent calls is
+capped. HTTP/2 is used for Groq when the optional `h2` package is installed.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import httpx
+from decouple import config
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "30"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60"))
+# Upper bound on LLM calls in flight across all providers
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# How long a call may wait for a free slot before giving up
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+
+class LLMBusyError(RuntimeError):
+    """Raised when no concurrency slot frees up within LLM_QUEUE_TIMEOUT"""
+
+
+class LLMGateway:
+    """
+    Lazily created, long-lived provider clients behind a shared concurrency limit.
+
+    Clients are built on first use so the app can start without API keys;
+    the call then fails the same way a direct client call would.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, queue_timeout: float = LLM_QUEUE_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._groq = None
+        self._gemini_models: Dict[Any, Any] = {}
+        self._gemini_configured = False
+        self._stats = {provider: {"calls": 0, "errors": 0, "rejected": 0, "in_flight": 0, "total_seconds": 0.0}
+                       for provider in ("groq", "gemini")}
+
+    @contextmanager
+    def _slot(self, provider: str):
+        stats = self._stats[provider]
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                stats["rejected"] += 1
+            raise LLMBusyError(f"Too many concurrent LLM calls (limit {self.max_concurrency})")
+
+        started = time.perf_counter()
+        with self._lock:
+            stats["in_flight"] += 1
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                stats["in_flight"] -= 1
+                stats["calls"] += 1
+                stats["total_seconds"] += time.perf_counter() - started
+            self._slots.release()
+
+    def groq_client(self):
+        if self._groq is None:
+            with self._lock:
+                if self._groq is None:
+                    from groq import Groq
+                    http_client = httpx.Client(
+                        http2=HTTP2_AVAILABLE,
+                        timeout=GROQ_TIMEOUT,
+                        limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                            max_keepalive_connections=LLM_MAX_CONNECTIONS)
+                    )
+                    self._groq = Groq(api_key=config("GROQ_API_KEY", default=None), http_client=http_client,
+                                      timeout=GROQ_TIMEOUT)
+        return self._groq
+
+    def groq_chat(self, **params):
+        """
+        Create a Groq chat completion
+
+        Args:
+            **params: Passed to client.chat.completions.create (model, messages, ...)
+
+        Returns:
+            The completion object
+
+        Raises:
+            LLMBusyError: if the concurrency limit is saturated
+        """
+        client = self.groq_client()
+        with self._slot("groq"):
+            return client.chat.completions.create(**params)
+
+    def groq_stream(self, **params) -> Iterator[str]:
+        """
+        Stream a Groq chat completion, yielding content deltas as they arrive
+
+        The concurrency slot is held until the generator finishes. Closing the
+        generator early (e.g. the HTTP client went away) closes the upstream
+        response, so Groq stops generating.
+
+        Raises:
+            LLMBusyError: if the concurrency limit is saturated
+        """
+        client = self.groq_client()
+        with self._slot("groq"):
+            stream = client.chat.completions.create(stream=True, **params)
+            try:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                stream.close()
+
+    def gemini_model(self, model_name: str, generation_config: Optional[dict] = None):
+        key = (model_name, tuple(sorted((generation_config or {}).items())))
+        model = self._gemini_models.get(key)
+        if model is None:
+            with self._lock:
+                import google.generativeai as genai
+                if not self._gemini_configured:
+                    genai.configure(api_key=config("GEMINI_API_KEY", default=None))
+                    self._gemini_configured = True
+                model = self._gemini_models.get(key)
+                if model is None:
+                    model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
+                    self._gemini_models[key] = model
+        return model
+
+    def gemini_generate(self, prompt: str, model_name: str = "gemini-1.5-flash",
+                        generation_config: Optional[dict] = None):
+        """
+        Generate content with a cached Gemini model
+
+        Raises:
+            LLMBusyError: if the concurrency limit is saturated
+        """
+        model = self.gemini_model(model_name, generation_config)
+        with self._slot("gemini"):
+            return model.generate_content(prompt, request_options={"timeout": GEMINI_TIMEOUT})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            providers = {}
+            for provider, s in self._stats.items():
+                providers[provider] = dict(s)
+                providers[provider]["avg_seconds"] = round(s["total_seconds"] / s["calls"], 3) if s["calls"] else 0
+                providers[provider]["total_seconds"] = round(s["total_seconds"], 3)
+            return {
+                "max_concurrency": self.max_concurrency,
+                "http2": HTTP2_AVAILABLE,
+                "providers": providers,
+            }
+
+
+llm = LLMGateway()
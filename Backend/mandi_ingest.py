@@ -0,0 +1,207 @@
+"""
+Ingest Mandi (data.gov.in) commodity prices into the local mandi_prices store.
+
+The request path reads prices from Mongo instead of calling the API. Run the
+ingestion once (e.g. from cron) or as a long-running process of its own:
+
+    python mandi_ingest.py             ingest now
+    python mandi_ingest.py schedule    ingest every MANDI_INGEST_INTERVAL seconds
+"""
+import logging
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlencode
+
+import requests
+
+from db import db, ensure_time_series
+
+# Mandi API Configuration
+MANDI_API_BASE_URL = "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
+MANDI_API_KEY = "579b464db66ec23bdd000001f5a25a2a2b0742cb77a83bfe30e97ba1"
+
+PAGE_SIZE = int(os.environ.get("MANDI_INGEST_PAGE_SIZE", "1000"))
+INGEST_INTERVAL = float(os.environ.get("MANDI_INGEST_INTERVAL", str(6 * 3600)))
+# How far back the request path looks for the latest price of a market
+PRICE_LOOKBACK_DAYS = int(os.environ.get("MANDI_PRICE_LOOKBACK_DAYS", "7"))
+
+mandi_prices_collection = db["mandi_prices"]
+logger = logging.getLogger("transport_optimizer")
+
+
+def fetch_records(page_size: int = PAGE_SIZE) -> Iterator[dict]:
+    """Page through the whole Mandi resource, yielding raw records"""
+    offset = 0
+    while True:
+        params = {
+            "api-key": MANDI_API_KEY,
+            "format": "json",
+            "offset": offset,
+            "limit": page_size
+        }
+        response = requests.get(f"{MANDI_API_BASE_URL}?{urlencode(params)}", timeout=30)
+        response.raise_for_status()
+        data = response.json()
+
+        records = data.get("records") or []
+        yield from records
+
+        offset += len(records)
+        total = int(data.get("total") or 0)
+        if not records or offset >= total:
+            break
+
+
+def _price(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_record(record: dict) -> Optional[dict]:
+    """
+    Turn an API record into a mandi_prices document
+
+    Returns:
+        The document, or None if the record lacks a market, date or modal price
+    """
+    modal_price = _price(record.get("modal_price"))
+    try:
+        date = datetime.strptime(record.get("arrival_date", ""), "%d/%m/%Y")
+    except ValueError:
+        return None
+    if modal_price is None or not record.get("market") or not record.get("commodity"):
+        return None
+
+    return {
+        "date": date,
+        "meta": {
+            "arrival_date": date.strftime("%Y-%m-%d"),
+            "state": (record.get("state") or "").strip(),
+            "district": (record.get("district") or "").strip(),
+            "market": record["market"].strip(),
+            "commodity": record["commodity"].strip(),
+            "variety": (record.get("variety") or "").strip(),
+        },
+        "modal_price": modal_price,
+        "min_price": _price(record.get("min_price")),
+        "max_price": _price(record.get("max_price")),
+    }
+
+
+def ingest(records: Optional[Iterable[dict]] = None, page_size: int = PAGE_SIZE) -> Dict[str, int]:
+    """
+    Fetch every record and replace the stored prices for each arrival date seen
+
+    Documents are written page by page, tagged with this run's id in
+    meta.ingest_run. Older runs' documents for the dates seen are deleted only
+    after every page is stored, so a day's prices never disappear mid-run
+    (deleting by a metaField value is supported on time-series collections).
+    If the run fails, its own documents are removed and the old ones stay.
+
+    Returns:
+        Number of stored documents per arrival date
+    """
+    run_id = uuid.uuid4().hex
+    counts: Counter = Counter()
+    skipped = 0
+    records = iter(records if records is not None else fetch_records(page_size))
+    try:
+        while True:
+            page = list(islice(records, page_size))
+            if not page:
+                break
+            docs = []
+            for record in page:
+                doc = normalize_record(record)
+                if doc is None:
+                    skipped += 1
+                    continue
+                doc["meta"]["ingest_run"] = run_id
+                docs.append(doc)
+                counts[doc["meta"]["arrival_date"]] += 1
+            if docs:
+                mandi_prices_collection.insert_many(docs, ordered=False)
+    except Exception:
+        mandi_prices_collection.delete_many({"meta.ingest_run": run_id})
+        raise
+
+    for arrival_date in sorted(counts):
+        mandi_prices_collection.delete_many({
+            "meta.arrival_date": arrival_date,
+            "meta.ingest_run": {"$ne": run_id}
+        })
+
+    counts = dict(sorted(counts.items()))
+    logger.info(f"Ingested Mandi prices {counts}, skipped {skipped} incomplete records")
+    return counts
+
+
+def latest_market_prices(commodity: str, state: Optional[str] = None) -> Dict[str, float]:
+    """
+    Latest stored modal price per market for a commodity
+
+    If a market reports several varieties on its latest day, the lowest price
+    is used, matching the conservative choice of the live API path.
+    """
+    match = {
+        "meta.commodity": commodity,
+        "date": {"$gte": datetime.now() - timedelta(days=PRICE_LOOKBACK_DAYS)}
+    }
+    if state:
+        match["meta.state"] = state
+
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"date": -1}},
+        {"$group": {
+            "_id": "$meta.market",
+            "latest": {"$first": "$date"},
+            "prices": {"$push": {"date": "$date", "price": "$modal_price"}}
+        }},
+    ]
+    prices = {}
+    for group in mandi_prices_collection.aggregate(pipeline):
+        latest = [p["price"] for p in group["prices"] if p["date"] == group["latest"]]
+        prices[group["_id"]] = min(latest)
+    return prices
+
+
+def stored_commodities() -> List[str]:
+    """Commodities with prices in the lookback window, sorted"""
+    since = datetime.now() - timedelta(days=PRICE_LOOKBACK_DAYS)
+    return sorted(mandi_prices_collection.distinct("meta.commodity", {"date": {"$gte": since}}))
+
+
+def run_scheduler(interval: float = INGEST_INTERVAL):
+    """Run ingest() now and then every interval seconds, forever"""
+    # Make sure the first insert doesn't create mandi_prices as a regular collection
+    try:
+        ensure_time_series()
+    except Exception as e:
+        logger.error(f"Error checking mandi_prices collection: {str(e)}")
+    while True:
+        try:
+            ingest()
+        except Exception as e:
+            logger.error(f"Mandi price ingestion failed: {str(e)}")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] == ["schedule"]:
+        run_scheduler()
+    elif sys.argv[1:]:
+        print(__doc__)
+        sys.exit(2)
+    from db import ensure_indexes
+    ensure_indexes()
+    print(ingest())
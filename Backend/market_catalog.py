@@ -0,0 +1,154 @@
+"""
+Catalog of mandis (markets) the transport optimizer can sell at.
+
+Markets come from the mandi_markets Mongo collection when it has any
+documents, otherwise from datasets/mandis.csv. A ball tree over the market
+coordinates answers "markets within R km" without scanning the catalog.
+
+Usage:
+    python market_catalog.py import markets.csv   # load a full APMC list into Mongo
+"""
+import csv
+import os
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from db import db
+from transport_costs import EARTH_RADIUS_KM
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+MARKET_CATALOG_PATH = os.environ.get("MARKET_CATALOG_PATH", os.path.join(base_dir, "datasets", "mandis.csv"))
+
+# Markets farther than this are not considered unless the caller asks
+DEFAULT_RADIUS_KM = float(os.environ.get("TRANSPORT_RADIUS_KM", "500"))
+# Fall back to the nearest markets when the radius holds fewer than this
+MIN_CANDIDATES = int(os.environ.get("TRANSPORT_MIN_CANDIDATES", "5"))
+
+mandi_markets_collection = db["mandi_markets"]
+
+
+def read_csv(path: str) -> List[dict]:
+    """Read markets from a CSV with market, state, district, latitude, longitude columns"""
+    with open(path, newline="", encoding="utf-8") as f:
+        return [{
+            "market": row["market"].strip(),
+            "state": row["state"].strip(),
+            "district": (row.get("district") or "").strip(),
+            "lat": float(row["latitude"]),
+            "lng": float(row["longitude"]),
+        } for row in csv.DictReader(f)]
+
+
+def read_mongo() -> List[dict]:
+    markets = []
+    for doc in mandi_markets_collection.find({}, {"_id": 0}):
+        lng, lat = doc["location"]["coordinates"]
+        markets.append({
+            "market": doc["market"],
+            "state": doc["state"],
+            "district": doc.get("district", ""),
+            "lat": lat,
+            "lng": lng,
+        })
+    return markets
+
+
+def import_csv(path: str) -> int:
+    """Replace the mandi_markets collection with the markets in a CSV file"""
+    docs = [{
+        "market": m["market"],
+        "state": m["state"],
+        "district": m["district"],
+        # GeoJSON order is [longitude, latitude]
+        "location": {"type": "Point", "coordinates": [m["lng"], m["lat"]]},
+    } for m in read_csv(path)]
+    mandi_markets_collection.delete_many({})
+    if docs:
+        mandi_markets_collection.insert_many(docs)
+    return len(docs)
+
+
+class MarketCatalog:
+    """
+    Market names, states and coordinates with a haversine ball tree.
+
+    Market names are unique keys; when a source repeats a name, the first
+    entry wins.
+    """
+
+    def __init__(self, markets: List[dict]):
+        self.coords: Dict[str, Tuple[float, float]] = {}
+        self.states: Dict[str, str] = {}
+        for m in markets:
+            if m["market"] not in self.coords:
+                self.coords[m["market"]] = (m["lat"], m["lng"])
+                self.states[m["market"]] = m["state"]
+
+        self.names = list(self.coords)
+        # Imported here: sklearn takes seconds to import and the catalog loads during warmup
+        from sklearn.neighbors import BallTree
+        self._tree = BallTree(np.radians(np.array([self.coords[n] for n in self.names])), metric="haversine")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, market: str) -> bool:
+        return market in self.coords
+
+    def distance(self, origin: str, destination: str) -> float:
+        """Great-circle distance between two markets in km"""
+        a, b = np.radians(self.coords[origin]), np.radians(self.coords[destination])
+        h = np.sin((b[0] - a[0]) / 2) ** 2 + np.cos(a[0]) * np.cos(b[0]) * np.sin((b[1] - a[1]) / 2) ** 2
+        return float(2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(min(h, 1.0))))
+
+    def nearby(self, origin: str, radius_km: float = DEFAULT_RADIUS_KM,
+               min_candidates: int = MIN_CANDIDATES) -> Tuple[List[str], np.ndarray]:
+        """
+        Markets within radius_km of origin, nearest first, origin included
+
+        If fewer than min_candidates fall inside the radius, the nearest
+        min_candidates markets are returned instead.
+
+        Returns:
+            (market names, distances in km)
+        """
+        point = np.radians([self.coords[origin]])
+        indices, distances = self._tree.query_radius(point, r=radius_km / EARTH_RADIUS_KM,
+                                                     return_distance=True, sort_results=True)
+        indices, distances = indices[0], distances[0]
+        if len(indices) < min(min_candidates, len(self.names)):
+            distances, indices = self._tree.query(point, k=min(min_candidates, len(self.names)))
+            indices, distances = indices[0], distances[0]
+        return [self.names[i] for i in indices], distances * EARTH_RADIUS_KM
+
+
+_catalog: Optional[MarketCatalog] = None
+_lock = threading.Lock()
+
+
+def load_catalog() -> MarketCatalog:
+    """Load the catalog once, preferring Mongo over the bundled CSV"""
+    global _catalog
+    if _catalog is None:
+        with _lock:
+            if _catalog is None:
+                markets = []
+                try:
+                    markets = read_mongo()
+                except Exception as e:
+                    print(f"Error reading mandi_markets, using {MARKET_CATALOG_PATH}: {str(e)}")
+                if not markets:
+                    markets = read_csv(MARKET_CATALOG_PATH)
+                _catalog = MarketCatalog(markets)
+                print(f"Loaded market catalog with {len(_catalog)} markets")
+    return _catalog
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "import":
+        print(__doc__)
+        sys.exit(2)
+    print(f"Imported {import_csv(sys.argv[2])} markets into mandi_markets")
@@ -0,0 +1,98 @@
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from gazetteer import normalize_place
+
+
+def _tokens(name: str) -> Tuple[str, ...]:
+    return tuple(normalize_place(name).split())
+
+
+class PhraseIndex:
+    """
+    Finds known multi-word phrases inside a tokenized name.
+
+    Phrases are bucketed by their first token, so matching a name costs one
+    dict lookup per token plus a short tuple compare per candidate phrase,
+    independent of how many phrases are indexed.
+    """
+
+    def __init__(self):
+        self._by_first = defaultdict(list)  # first token -> [(tokens, value)]
+
+    def add(self, phrase: str, value):
+        tokens = _tokens(phrase)
+        if tokens:
+            self._by_first[tokens[0]].append((tokens, value))
+            # Longest phrase first, so "navi mumbai" wins over "navi"
+            self._by_first[tokens[0]].sort(key=lambda entry: -len(entry[0]))
+
+    def first_match(self, tokens: Tuple[str, ...]):
+        """Return the value of the first indexed phrase found in tokens, or None"""
+        for i, token in enumerate(tokens):
+            for phrase, value in self._by_first.get(token, ()):
+                if tokens[i:i + len(phrase)] == phrase:
+                    return value
+        return None
+
+
+class MarketIndex:
+    """
+    Resolves Mandi market names to the cities and states of the transport graph.
+
+    A market maps to a city when the city name appears in it as whole words
+    ("Mumbai" in "Navi Mumbai APMC"), and to a state when the state name
+    appears in it or the market name is part of the state name. Resolutions
+    are memoized per market name, so a price snapshot is mapped in one pass
+    over its markets.
+    """
+
+    def __init__(self, city_to_state: Dict[str, str]):
+        self.city_to_state = dict(city_to_state)
+        self._cities = PhraseIndex()
+        self._states = PhraseIndex()
+        # Every contiguous run of words in a state name -> state, for markets
+        # named after part of a state ("Delhi" for "NCT of Delhi")
+        self._state_parts: Dict[Tuple[str, ...], str] = {}
+        for city, state in self.city_to_state.items():
+            self._cities.add(city, city)
+            self._states.add(state, state)
+            tokens = _tokens(state)
+            for i in range(len(tokens)):
+                for j in range(i + 1, len(tokens) + 1):
+                    self._state_parts.setdefault(tokens[i:j], state)
+        self._resolved: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, market: str) -> Tuple[Optional[str], Optional[str]]:
+        """Return (city, state) for a market name; either may be None"""
+        resolved = self._resolved.get(market)
+        if resolved is None:
+            tokens = _tokens(market)
+            city = self._cities.first_match(tokens)
+            state = self._states.first_match(tokens) or self._state_parts.get(tokens)
+            resolved = (city, state)
+            with self._lock:
+                self._resolved[market] = resolved
+        return resolved
+
+    def map_prices(self, market_prices: Dict[str, float]) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """
+        Split a price snapshot into direct city prices and per-state averages
+
+        Returns:
+            (city_prices, state_avg_prices). A city with several matching
+            markets keeps the first one seen.
+        """
+        city_prices: Dict[str, float] = {}
+        state_prices: Dict[str, List[float]] = defaultdict(list)
+        for market, price in market_prices.items():
+            city, state = self.resolve(market)
+            if city is not None and city not in city_prices:
+                city_prices[city] = price
+            if state is not None:
+                state_prices[state].append(price)
+
+        state_avg_prices = {state: sum(prices) / len(prices) for state, prices in state_prices.items()}
+        return city_prices, state_avg_prices
@@ -0,0 +1,96 @@
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import joblib
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(base_dir, "models")
+
+# Set MODEL_HOT_RELOAD=0 to skip the mtime check on every lookup
+HOT_RELOAD = os.environ.get("MODEL_HOT_RELOAD", "1") != "0"
+
+
+class ModelRegistry:
+    """
+    Loads the pickled artifacts under models/ once and hands out warm copies.
+
+    Artifacts are keyed by their path relative to the models directory
+    (e.g. "xgb_fertilizer_model.pkl" or "crop_recommendation/minmaxscaler_crop_recommendation.pkl").
+    When hot reload is enabled, a changed file mtime triggers a reload on the
+    next lookup; callers that already hold a reference keep using the old one.
+    """
+
+    def __init__(self, models_dir: str = MODELS_DIR, loader: Callable[[str], Any] = joblib.load,
+                 hot_reload: bool = HOT_RELOAD):
+        self.models_dir = models_dir
+        self.hot_reload = hot_reload
+        self._loader = loader
+        self._entries: Dict[str, tuple] = {}  # name -> (mtime, artifact)
+        self._lock = threading.Lock()
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.models_dir, name)
+
+    def get(self, name: str) -> Any:
+        """
+        Return the loaded artifact, loading (or reloading) it if needed
+
+        Args:
+            name: Artifact path relative to the models directory
+
+        Returns:
+            The unpickled artifact
+        """
+        entry = self._entries.get(name)
+        if entry is not None and not self.hot_reload:
+            return entry[1]
+
+        path = self.path_for(name)
+        mtime = os.path.getmtime(path)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        with self._lock:
+            # Another thread may have loaded it while we were waiting
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == mtime:
+                return entry[1]
+
+            artifact = self._loader(path)
+            self._entries[name] = (mtime, artifact)
+            print(f"{'Reloaded' if entry else 'Loaded'} model artifact {name}")
+            return artifact
+
+    def get_many(self, *names: str) -> tuple:
+        """Return several artifacts at once, e.g. a model together with its encoders"""
+        return tuple(self.get(name) for name in names)
+
+    def load_all(self) -> Dict[str, Optional[str]]:
+        """
+        Load every .pkl artifact under the models directory
+
+        Returns:
+            Dictionary mapping artifact name to an error message, or None if it loaded
+        """
+        results = {}
+        for root, _, files in os.walk(self.models_dir):
+            for filename in sorted(files):
+                if not filename.endswith(".pkl"):
+                    continue
+                name = os.path.relpath(os.path.join(root, filename), self.models_dir)
+                try:
+                    self.get(name)
+                    results[name] = None
+                except Exception as e:
+                    print(f"Error loading model artifact {name}: {str(e)}")
+                    results[name] = str(e)
+        return results
+
+    def loaded(self) -> Dict[str, float]:
+        """Return the names of the loaded artifacts with the mtime they were loaded at"""
+        return {name: entry[0] for name, entry in self._entries.items()}
+
+
+# Shared registry used by the API
+registry = ModelRegistry()
@@ -0,0 +1,147 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def parse_page_args(args: Dict[str, Any], default_limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+    """
+    Read keyset pagination options from request args or a JSON body
+
+    Recognised keys: limit (capped at MAX_PAGE_SIZE), cursor (the next_cursor of
+    the previous page), order (asc or desc by _id) and fields (comma separated
+    list or JSON array of fields to return).
+
+    Raises:
+        ValueError: if any option is malformed
+    """
+    try:
+        limit = int(args.get("limit") or default_limit)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+
+    cursor, cursor_value = decode_cursor(args.get("cursor"))
+
+    order = str(args.get("order") or "asc").lower()
+    if order not in ("asc", "desc"):
+        raise ValueError("order must be 'asc' or 'desc'")
+
+    fields = args.get("fields")
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    elif fields is not None and not (isinstance(fields, list) and all(isinstance(f, str) for f in fields)):
+        raise ValueError("fields must be a comma separated string or a list of field names")
+
+    return {
+        "limit": min(limit, MAX_PAGE_SIZE),
+        "cursor": cursor,
+        "cursor_value": cursor_value,
+        "order": pymongo.ASCENDING if order == "asc" else pymongo.DESCENDING,
+        "projection": {field: 1 for field in fields} if fields else None,
+    }
+
+
+def encode_cursor(doc: Dict[str, Any], sort_field: Optional[str] = None) -> str:
+    """
+    Build the cursor for the page after doc
+
+    Pages ordered by _id use the plain ObjectId; pages ordered by another
+    field carry that field's value too, as url-safe base64 JSON.
+    """
+    if not sort_field:
+        return str(doc["_id"])
+    token = json.dumps({"v": doc.get(sort_field), "id": str(doc["_id"])})
+    return base64.urlsafe_b64encode(token.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str]) -> Tuple[Optional[ObjectId], Any]:
+    """Return the (_id, sort value) pair encoded by encode_cursor"""
+    if not cursor:
+        return None, None
+    try:
+        return ObjectId(cursor), None
+    except (InvalidId, TypeError):
+        pass
+    try:
+        token = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return ObjectId(token["id"]), token["v"]
+    except (ValueError, TypeError, KeyError, InvalidId):
+        raise ValueError("Invalid cursor")
+
+
+def page_query(query: Dict[str, Any], page: Dict[str, Any], sort_field: Optional[str] = None) -> Dict[str, Any]:
+    """Add the keyset condition for the page's cursor to a filter"""
+    if not page["cursor"]:
+        return query
+    operator = "$gt" if page["order"] == pymongo.ASCENDING else "$lt"
+    if not sort_field:
+        return {**query, "_id": {operator: page["cursor"]}}
+
+    # Strictly past the last value, or the same value with a later _id.
+    # Comparison operators never match null, and null (or missing) sorts
+    # before every value, so null has to be handled on its own.
+    value = page["cursor_value"]
+    ascending = page["order"] == pymongo.ASCENDING
+    after = [{sort_field: value, "_id": {operator: page["cursor"]}}]
+    if value is not None:
+        after.append({sort_field: {operator: value}})
+        if not ascending:
+            after.append({sort_field: None})
+    elif ascending:
+        after.append({sort_field: {"$ne": None}})
+    after = {"$or": after}
+    return {"$and": [query, after]} if query else after
+
+
+def fetch_page(collection, query: Dict[str, Any], page: Dict[str, Any],
+               sort_field: Optional[str] = None) -> Tuple[list, Optional[str]]:
+    """
+    Fetch one page of documents ordered by sort_field (if given) and then _id
+
+    Returns:
+        The documents and the cursor for the next page (None on the last page)
+    """
+    sort = [("_id", page["order"])]
+    if sort_field:
+        sort.insert(0, (sort_field, page["order"]))
+
+    projection = page["projection"]
+    if projection and sort_field:
+        # The cursor needs the sort value even if the client didn't ask for it
+        projection = {**projection, sort_field: 1}
+
+    cursor = collection.find(page_query(query, page, sort_field), projection) \
+        .sort(sort) \
+        .limit(page["limit"] + 1)
+    docs = list(cursor)
+
+    next_cursor = None
+    if len(docs) > page["limit"]:
+        docs = docs[:page["limit"]]
+        next_cursor = encode_cursor(docs[-1], sort_field)
+    return docs, next_cursor
+
+
+def serialize_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert ObjectId and datetime values so a document can be JSON encoded"""
+    def convert(value):
+        if isinstance(value, ObjectId):
+            return str(value)
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, dict):
+            return {k: convert(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [convert(v) for v in value]
+        return value
+
+    return {key: convert(value) for key, value in doc.items()}
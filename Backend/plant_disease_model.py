@@ -1,24 +1,343 @@
 from transformers import AutoImageProcessor, AutoModelForImageClassification
 from PIL import Image
+from concurrent.futures import Future
+from typing import BinaryIO, Union
+import io
+import os
+import queue
+import threading
+import time
 import torch
 
+MODEL_NAME = "linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification"
+
 # Load model and processor once
-processor = AutoImageProcessor.from_pretrained("linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification")
-model = AutoModelForImageClassification.from_pretrained("linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification")
+processor = AutoImageProcessor.from_pretrained(MODEL_NAME)
+model = AutoModelForImageClassification.from_pretrained(MODEL_NAME)
+model.eval()
 
-# Predict function
-def predict_disease(image_path: str):
-    image = Image.open(image_path).convert("RGB")
+# Inference backend: eager, quantized, torchscript, compile or onnx
+MODEL_BACKEND = os.environ.get("DISEASE_MODEL_BACKEND", "eager").lower()
+ONNX_PATH = os.environ.get(
+    "DISEASE_ONNX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "plant_disease", "mobilenet_v2.onnx")
+)
+
+# Reference images for check_backend_parity, and where its results are recorded
+PARITY_IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "datasets", "disease_parity")
+PARITY_RESULTS_PATH = os.path.join(PARITY_IMAGES_DIR, "results.json")
+
+# Micro-batching settings: a batch runs once it has MAX_BATCH_SIZE images or
+# the oldest image has waited MAX_BATCH_WAIT_MS, whichever comes first
+MAX_BATCH_SIZE = int(os.environ.get("DISEASE_MAX_BATCH_SIZE", "8"))
+MAX_BATCH_WAIT_MS = float(os.environ.get("DISEASE_MAX_BATCH_WAIT_MS", "10"))
+
+
+def preprocess(image: Image.Image) -> torch.Tensor:
+    """Turn a PIL image into a (1, 3, 224, 224) pixel tensor"""
+    return processor(images=image, return_tensors="pt")["pixel_values"]
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Wraps the HF model so tracing/export sees a plain tensor -> tensor forward"""
+
+    def __init__(self, wrapped):
+        super().__init__()
+        self.wrapped = wrapped
+
+    def forward(self, pixel_values):
+        return self.wrapped(pixel_values=pixel_values).logits
+
+
+def _example_input(batch_size: int = 1) -> torch.Tensor:
+    crop_size = getattr(processor, "crop_size", None) or {"height": 224, "width": 224}
+    return torch.randn(batch_size, 3, crop_size["height"], crop_size["width"])
+
+
+def _build_onnx_backend():
+    # onnx and onnxruntime are optional and only needed for this backend
+    import onnxruntime as ort
+
+    if not os.path.exists(ONNX_PATH):
+        os.makedirs(os.path.dirname(ONNX_PATH), exist_ok=True)
+        torch.onnx.export(
+            _LogitsOnly(model), _example_input(), ONNX_PATH,
+            input_names=["pixel_values"], output_names=["logits"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=17
+        )
+        print(f"Exported plant disease model to {ONNX_PATH}")
+
+    session = ort.InferenceSession(ONNX_PATH, providers=["CPUExecutionProvider"])
+    return lambda pixel_values: torch.from_numpy(
+        session.run(["logits"], {"pixel_values": pixel_values.numpy()})[0]
+    )
 
-    inputs = processor(images=image, return_tensors="pt", padding=True)
+
+def build_backend(name: str):
+    """
+    Return a callable mapping a pixel batch to logits for the given backend
+
+    - eager: the HF model as loaded (fp32)
+    - quantized: dynamic int8 quantization of the Linear layers. In
+      MobileNetV2 that is only the classifier head (the backbone is
+      convolutions), so expect almost no CPU speedup over eager
+    - torchscript: traced and frozen TorchScript module
+    - compile: torch.compile of the eager model
+    - onnx: ONNX Runtime session over an exported copy at ONNX_PATH
+    """
+    if name == "eager":
+        return lambda pixel_values: model(pixel_values=pixel_values).logits
+    if name == "quantized":
+        quantized = torch.ao.quantization.quantize_dynamic(_LogitsOnly(model), {torch.nn.Linear}, dtype=torch.qint8)
+        return quantized
+    if name == "torchscript":
+        with torch.no_grad():
+            traced = torch.jit.trace(_LogitsOnly(model), _example_input(), strict=False)
+        return torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+    if name == "compile":
+        return torch.compile(_LogitsOnly(model))
+    if name == "onnx":
+        return _build_onnx_backend()
+    raise ValueError(f"Unknown plant disease model backend: {name}")
+
+
+try:
+    backend = build_backend(MODEL_BACKEND)
+    print(f"Plant disease model using {MODEL_BACKEND} backend")
+except Exception as e:
+    print(f"Error building {MODEL_BACKEND} backend, falling back to eager: {str(e)}")
+    MODEL_BACKEND = "eager"
+    backend = build_backend(MODEL_BACKEND)
+
+
+def predict_batch(pixel_values: torch.Tensor, forward=None) -> list:
+    """Run one forward pass over a stacked batch and return a prediction per image"""
     with torch.no_grad():
-        outputs = model(**inputs)
+        logits = (forward or backend)(pixel_values)
+
+    confidences, class_ids = torch.softmax(logits, dim=1).max(dim=1)
+    return [
+        {"class": model.config.id2label[class_id], "confidence": confidence}
+        for class_id, confidence in zip(class_ids.tolist(), confidences.tolist())
+    ]
+
+
+class BatchingPredictor:
+    """
+    Collects concurrent requests into batches for a single forward pass.
+
+    Callers preprocess on their own thread and submit the pixel tensor; a
+    background worker stacks up to max_batch_size tensors (waiting at most
+    max_wait_ms for the batch to fill), runs predict_batch once and resolves
+    each caller's future with its own result.
+    """
+
+    STAGES = ("preprocess", "queue_wait", "inference")
+
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_BATCH_WAIT_MS):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._last_batch_size = 0
+        self._largest_batch_size = 0
+        self._stage_totals = {stage: 0.0 for stage in self.STAGES}
+        self._stage_counts = {stage: 0 for stage in self.STAGES}
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="disease-batcher", daemon=True)
+                self._worker.start()
+
+    def submit(self, pixel_values: torch.Tensor) -> Future:
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((pixel_values, future, time.perf_counter()))
+        return future
+
+    def predict(self, pixel_values: torch.Tensor, timeout: float = None) -> dict:
+        return self.submit(pixel_values).result(timeout=timeout)
+
+    def record(self, stage: str, elapsed_ms: float, count: int = 1):
+        with self._stats_lock:
+            self._stage_totals[stage] += elapsed_ms * count
+            self._stage_counts[stage] += count
 
-    logits = outputs.logits
-    predicted_class_idx = logits.argmax(-1).item()
-    predicted_class = model.config.id2label[predicted_class_idx]
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
 
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.record("queue_wait", (started - enqueued) * 1000)
+
+            try:
+                results = predict_batch(torch.cat([pixel_values for pixel_values, _, _ in batch]))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            self.record("inference", (time.perf_counter() - started) * 1000, count=len(batch))
+            with self._stats_lock:
+                self._batches += 1
+                self._requests += len(batch)
+                self._last_batch_size = len(batch)
+                self._largest_batch_size = max(self._largest_batch_size, len(batch))
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        """Return batch sizes, current queue depth and average per-stage latency in ms"""
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "requests": self._requests,
+                "avg_batch_size": round(self._requests / self._batches, 2) if self._batches else 0,
+                "last_batch_size": self._last_batch_size,
+                "largest_batch_size": self._largest_batch_size,
+                "avg_stage_ms": {
+                    stage: round(self._stage_totals[stage] / self._stage_counts[stage], 2)
+                    if self._stage_counts[stage] else 0
+                    for stage in self.STAGES
+                },
+            }
+
+
+batcher = BatchingPredictor()
+
+
+# Smallest edge the processor resizes to; decoding below this would lose detail
+_size = getattr(processor, "size", None) or {}
+DECODE_MIN_SIZE = _size.get("shortest_edge") or _size.get("height") or 224
+
+# Modes Image.reduce supports
+_REDUCE_MODES = {"RGB", "RGBA", "L", "LA", "CMYK"}
+
+
+def load_image(source: Union[str, bytes, BinaryIO], downscale: bool = True) -> Image.Image:
+    """
+    Decode an image from a path, raw bytes or a file-like object
+
+    With downscale enabled, large photos are shrunk while decoding (JPEG DCT
+    scaling via draft, or reduce for other formats) to no less than
+    DECODE_MIN_SIZE on the short edge, since the processor resizes to that anyway.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    image = Image.open(source)
+
+    if downscale:
+        target = (DECODE_MIN_SIZE, DECODE_MIN_SIZE)
+        if image.format == "JPEG":
+            image.draft("RGB", target)
+        else:
+            factor = min(image.size) // DECODE_MIN_SIZE
+            if factor >= 2:
+                # reduce() only handles these modes; palette, 1-bit and 16-bit
+                # images are converted first
+                if image.mode not in _REDUCE_MODES:
+                    image = image.convert("RGB")
+                image = image.reduce(factor)
+
+    return image.convert("RGB")
+
+
+# Predict function
+def predict_disease(image: Union[str, bytes, BinaryIO], downscale: bool = True):
+    image = load_image(image, downscale=downscale)
+
+    started = time.perf_counter()
+    pixel_values = preprocess(image)
+    batcher.record("preprocess", (time.perf_counter() - started) * 1000)
+
+    return batcher.predict(pixel_values)
+
+
+def parity_images() -> list:
+    """The bundled reference images in PARITY_IMAGES_DIR, sorted"""
+    return sorted(
+        os.path.join(PARITY_IMAGES_DIR, name) for name in os.listdir(PARITY_IMAGES_DIR)
+        if name.lower().endswith((".jpg", ".jpeg", ".png"))
+    )
+
+
+def check_backend_parity(image_paths: list = None, backend_name: str = MODEL_BACKEND) -> dict:
+    """
+    Compare a backend against the eager model on a fixed set of images
+
+    Args:
+        image_paths: Images to compare on (default: the bundled reference set,
+            see datasets/disease_parity/README.md)
+        backend_name: Backend to compare
+
+    Returns:
+        Top-1 agreement rate, the largest absolute confidence difference and
+        the images whose predicted class differs
+    """
+    image_paths = image_paths or parity_images()
+    candidate = backend if backend_name == MODEL_BACKEND else build_backend(backend_name)
+    eager = build_backend("eager")
+
+    pixel_values = torch.cat([preprocess(load_image(path)) for path in image_paths])
+    expected = predict_batch(pixel_values, forward=eager)
+    actual = predict_batch(pixel_values, forward=candidate)
+
+    mismatches = [
+        {"image": os.path.basename(path), "eager": e["class"], backend_name: a["class"]}
+        for path, e, a in zip(image_paths, expected, actual) if e["class"] != a["class"]
+    ]
     return {
-        "class": predicted_class,
-        "confidence": torch.softmax(logits, dim=1)[0][predicted_class_idx].item()
+        "backend": backend_name,
+        "images": len(image_paths),
+        "top1_agreement": 1 - len(mismatches) / len(image_paths),
+        "max_confidence_diff": max(abs(e["confidence"] - a["confidence"]) for e, a in zip(expected, actual)),
+        "mismatches": mismatches,
     }
+
+
+if __name__ == "__main__":
+    # python plant_disease_model.py <backend> [<image> ...]
+    # Without images, checks the bundled reference set and records the result
+    # in PARITY_RESULTS_PATH
+    import sys
+    import json
+
+    if len(sys.argv) < 2:
+        print("Usage: python plant_disease_model.py <backend> [<image> ...]")
+        sys.exit(1)
+    result = check_backend_parity(sys.argv[2:], sys.argv[1])
+    print(json.dumps(result, indent=2))
+
+    if not sys.argv[2:]:
+        recorded = {}
+        if os.path.exists(PARITY_RESULTS_PATH):
+            with open(PARITY_RESULTS_PATH) as f:
+                recorded = json.load(f)
+        recorded[sys.argv[1]] = {**result, "torch": torch.__version__, "recorded_at": time.strftime("%Y-%m-%d")}
+        with open(PARITY_RESULTS_PATH, "w") as f:
+            json.dump(recorded, f, indent=2, sort_keys=True)
@@ -0,0 +1,282 @@
+"""
+Multi-stop, multi-truck route planning for pooled crop transport.
+
+Each truck leaves its depot, picks up farmers' loads in order and sells
+everything at one market. Loads that no route improves on are sold at the
+farmer's own market with no transport. The planner maximizes total net
+profit (revenue minus transport cost) with a greedy-insertion start and a
+local search (relocate, swap and 2-opt moves) that stops at a time budget.
+"""
+import os
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from transport_costs import BASE_COST_PER_KM, FUEL_LOAD_FACTOR, KM_PER_LITER, distance_matrix
+
+DEFAULT_TIME_BUDGET_MS = float(os.environ.get("ROUTE_TIME_BUDGET_MS", "500"))
+MAX_TIME_BUDGET_MS = float(os.environ.get("ROUTE_MAX_TIME_BUDGET_MS", "5000"))
+
+_EPSILON = 1e-9
+
+
+class RoutePlanner:
+    """
+    Capacitated vehicle routing heuristic over a fixed set of points.
+
+    Args:
+        loads: [{"farmer", "city", "crop", "weight_kg"}]
+        trucks: [{"id", "capacity_kg", "depot"}]
+        markets: Candidate market names to sell at
+        coords: Name -> (lat, lng) for every city, depot and market used
+        prices: Crop -> {market: price per kg}; every load's own city must be priced
+        fuel_price: Fuel price per liter for the whole plan
+        seed: Optional seed for the local search's move order
+    """
+
+    def __init__(self, loads: List[dict], trucks: List[dict], markets: List[str],
+                 coords: Dict[str, Tuple[float, float]], prices: Dict[str, Dict[str, float]],
+                 fuel_price: float, seed: Optional[int] = None):
+        self.loads = loads
+        self.trucks = trucks
+        self.markets = list(dict.fromkeys(markets + [load["city"] for load in loads]))
+        self.fuel_price = fuel_price
+        self.rng = random.Random(seed)
+
+        names = list(dict.fromkeys(self.markets + [t["depot"] for t in trucks]))
+        self.point = {name: i for i, name in enumerate(names)}
+        self.names = names
+        self.distances = distance_matrix(np.array([coords[name] for name in names], dtype=float))
+        self.market_points = np.array([self.point[m] for m in self.markets])
+
+        self.weights = np.array([float(load["weight_kg"]) for load in loads])
+        self.load_points = [self.point[load["city"]] for load in loads]
+        # revenue[i, m]: selling load i at market m; unpriced markets can't be used
+        self.revenue = np.array([
+            [prices[load["crop"]].get(m, np.nan) * load["weight_kg"] for m in self.markets]
+            for load in loads
+        ]).reshape(len(loads), len(self.markets))
+        self.revenue = np.where(np.isnan(self.revenue), -np.inf, self.revenue)
+        own_market = {m: j for j, m in enumerate(self.markets)}
+        self.local_value = np.array([self.revenue[i, own_market[load["city"]]] for i, load in enumerate(loads)])
+
+        self._values: Dict[Tuple[int, Tuple[int, ...]], Tuple[float, int]] = {}
+        self.evaluations = 0
+
+    def leg_cost(self, distance_km, load_kg: float):
+        return distance_km / KM_PER_LITER * self.fuel_price * FUEL_LOAD_FACTOR + \
+            distance_km * BASE_COST_PER_KM * (load_kg / 100)
+
+    def route_value(self, truck: int, seq: Tuple[int, ...]) -> Tuple[float, int]:
+        """Net profit of a route and the index of the market it sells at (-1 if empty)"""
+        if not seq:
+            return 0.0, -1
+        key = (truck, seq)
+        cached = self._values.get(key)
+        if cached is not None:
+            return cached
+
+        self.evaluations += 1
+        position = self.point[self.trucks[truck]["depot"]]
+        load_kg, cost = 0.0, 0.0
+        for i in seq:
+            cost += self.leg_cost(self.distances[position, self.load_points[i]], load_kg)
+            load_kg += self.weights[i]
+            position = self.load_points[i]
+
+        # Best market for this set of loads, over all candidates at once
+        values = self.revenue[list(seq)].sum(axis=0) - self.leg_cost(self.distances[position, self.market_points], load_kg)
+        market = int(np.argmax(values))
+        result = (float(values[market] - cost), market)
+        self._values[key] = result
+        return result
+
+    def _fits(self, truck: int, seq) -> bool:
+        return self.weights[list(seq)].sum() <= self.trucks[truck]["capacity_kg"] + _EPSILON
+
+    def _best_insertion(self, routes: List[List[int]], i: int):
+        """Best (gain, truck, position) for adding load i to a route, gain relative to selling locally"""
+        best = (0.0, -1, -1)
+        for t, seq in enumerate(routes):
+            if not self._fits(t, seq + [i]):
+                continue
+            base = self.route_value(t, tuple(seq))[0]
+            for p in range(len(seq) + 1):
+                candidate = tuple(seq[:p] + [i] + seq[p:])
+                gain = self.route_value(t, candidate)[0] - base - self.local_value[i]
+                if gain > best[0] + _EPSILON:
+                    best = (gain, t, p)
+        return best
+
+    def total_value(self, routes: List[List[int]]) -> float:
+        routed = {i for seq in routes for i in seq}
+        local = sum(self.local_value[i] for i in range(len(self.loads)) if i not in routed)
+        return sum(self.route_value(t, tuple(seq))[0] for t, seq in enumerate(routes)) + local
+
+    def construct(self, deadline: Optional[float] = None) -> List[List[int]]:
+        """Greedy insertion, heaviest loads first; loads left at the deadline are sold locally"""
+        routes: List[List[int]] = [[] for _ in self.trucks]
+        for i in sorted(range(len(self.loads)), key=lambda i: -self.weights[i]):
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            gain, t, p = self._best_insertion(routes, i)
+            if t >= 0:
+                routes[t].insert(p, i)
+        return routes
+
+    def _relocate(self, routes: List[List[int]], i: int) -> bool:
+        """Move load i to its best route/position, or out of routing, if that gains"""
+        current = next((t for t, seq in enumerate(routes) if i in seq), -1)
+        if current >= 0:
+            seq = routes[current]
+            removed = [j for j in seq if j != i]
+            # Gain of removing i, selling it locally instead
+            removal_gain = self.route_value(current, tuple(removed))[0] + self.local_value[i] - \
+                self.route_value(current, tuple(seq))[0]
+        else:
+            removed, removal_gain = None, 0.0
+
+        trial = [list(seq) for seq in routes]
+        if current >= 0:
+            trial[current] = removed
+        gain, t, p = self._best_insertion(trial, i)
+
+        # Reinserting into the same route at a different position is also a move
+        if removal_gain + gain > _EPSILON and t >= 0:
+            trial[t].insert(p, i)
+            routes[:] = trial
+            return True
+        if current >= 0 and removal_gain > _EPSILON:
+            routes[:] = trial
+            return True
+        return False
+
+    def _swap(self, routes: List[List[int]], a: int, b: int) -> bool:
+        """Exchange one load between routes a and b if that gains"""
+        before = self.route_value(a, tuple(routes[a]))[0] + self.route_value(b, tuple(routes[b]))[0]
+        for x, i in enumerate(routes[a]):
+            for y, j in enumerate(routes[b]):
+                new_a = routes[a][:x] + [j] + routes[a][x + 1:]
+                new_b = routes[b][:y] + [i] + routes[b][y + 1:]
+                if not (self._fits(a, new_a) and self._fits(b, new_b)):
+                    continue
+                after = self.route_value(a, tuple(new_a))[0] + self.route_value(b, tuple(new_b))[0]
+                if after > before + _EPSILON:
+                    routes[a], routes[b] = new_a, new_b
+                    return True
+        return False
+
+    def _two_opt(self, routes: List[List[int]], t: int) -> bool:
+        """Reverse a segment of the pickup order of route t if that gains"""
+        seq = routes[t]
+        before = self.route_value(t, tuple(seq))[0]
+        for x in range(len(seq) - 1):
+            for y in range(x + 1, len(seq)):
+                candidate = seq[:x] + seq[x:y + 1][::-1] + seq[y + 1:]
+                if self.route_value(t, tuple(candidate))[0] > before + _EPSILON:
+                    routes[t] = candidate
+                    return True
+        return False
+
+    def solve(self, time_budget_ms: float = DEFAULT_TIME_BUDGET_MS) -> Tuple[List[List[int]], dict]:
+        """
+        Build routes and improve them until no move helps or the budget runs out
+
+        Returns:
+            (routes as lists of load indices per truck, solver stats)
+        """
+        started = time.perf_counter()
+        deadline = started + time_budget_ms / 1000
+        routes = self.construct(deadline)
+        initial = float(self.total_value(routes))
+
+        passes, improved, timed_out = 0, True, False
+        while improved:
+            improved = False
+            passes += 1
+            moves = [("relocate", i) for i in range(len(self.loads))]
+            moves += [("two_opt", t) for t in range(len(self.trucks))]
+            moves += [("swap", (a, b)) for a in range(len(self.trucks)) for b in range(a + 1, len(self.trucks))]
+            self.rng.shuffle(moves)
+            for kind, arg in moves:
+                if time.perf_counter() >= deadline:
+                    timed_out = True
+                    break
+                if kind == "relocate":
+                    improved |= self._relocate(routes, arg)
+                elif kind == "two_opt":
+                    improved |= self._two_opt(routes, arg)
+                else:
+                    improved |= self._swap(routes, *arg)
+            if timed_out:
+                break
+
+        return routes, {
+            "initial_net_profit": round(initial, 2),
+            "passes": passes,
+            "route_evaluations": self.evaluations,
+            "timed_out": timed_out,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "time_budget_ms": time_budget_ms,
+        }
+
+    def describe(self, routes: List[List[int]]) -> dict:
+        """Turn solved routes into the API response"""
+        described = []
+        for t, seq in enumerate(routes):
+            if not seq:
+                continue
+            net_profit, market = self.route_value(t, tuple(seq))
+            position = self.point[self.trucks[t]["depot"]]
+            load_kg, distance_km, stops = 0.0, 0.0, []
+            for i in seq:
+                distance_km += self.distances[position, self.load_points[i]]
+                load_kg += self.weights[i]
+                position = self.load_points[i]
+                stops.append({"type": "pickup", "city": self.loads[i]["city"],
+                              "farmer": self.loads[i]["farmer"], "weight_kg": self.weights[i]})
+            sell_at = self.markets[market]
+            distance_km += self.distances[position, self.point[sell_at]]
+            stops.append({"type": "sell", "city": sell_at})
+            revenue = float(self.revenue[seq, market].sum())
+            described.append({
+                "truck": self.trucks[t]["id"],
+                "depot": self.trucks[t]["depot"],
+                "capacity_kg": self.trucks[t]["capacity_kg"],
+                "load_kg": load_kg,
+                "stops": stops,
+                "distance_km": round(float(distance_km), 2),
+                "revenue": round(revenue, 2),
+                "transport_cost": round(revenue - net_profit, 2),
+                "net_profit": round(net_profit, 2),
+            })
+
+        routed = {i for seq in routes for i in seq}
+        sold_locally = [{
+            "farmer": self.loads[i]["farmer"],
+            "city": self.loads[i]["city"],
+            "weight_kg": self.weights[i],
+            "net_profit": round(float(self.local_value[i]), 2),
+        } for i in range(len(self.loads)) if i not in routed]
+
+        return {
+            "routes": described,
+            "sold_locally": sold_locally,
+            "total_net_profit": round(float(self.total_value(routes)), 2),
+            "baseline_net_profit": round(float(self.local_value.sum()), 2),
+        }
+
+
+def plan_routes(loads: List[dict], trucks: List[dict], markets: List[str],
+                coords: Dict[str, Tuple[float, float]], prices: Dict[str, Dict[str, float]],
+                fuel_price: float, time_budget_ms: float = DEFAULT_TIME_BUDGET_MS,
+                seed: Optional[int] = None) -> dict:
+    """Solve and describe a routing problem; see RoutePlanner for the arguments"""
+    planner = RoutePlanner(loads, trucks, markets, coords, prices, fuel_price, seed)
+    routes, stats = planner.solve(min(time_budget_ms, MAX_TIME_BUDGET_MS))
+    result = planner.describe(routes)
+    result["solver"] = stats
+    result["fuel_price"] = fuel_price
+    return result
@@ -0,0 +1,37 @@
+from typing import Union
+
+import numpy as np
+
+# Mean earth radius, as used by the haversine package
+EARTH_RADIUS_KM = 6371.0088
+
+# Truck assumptions: 5 km per liter, fuel cost scaled for a 100 kg load, plus
+# a base cost of 0.50 per km for every 100 kg carried
+KM_PER_LITER = 5
+FUEL_LOAD_FACTOR = 100
+BASE_COST_PER_KM = 0.50
+
+
+def distance_matrix(coords: np.ndarray) -> np.ndarray:
+    """
+    All-pairs great-circle distances in km
+
+    Args:
+        coords: Array of shape (N, 2) with (lat, lng) in degrees
+
+    Returns:
+        Symmetric (N, N) array with a zero diagonal
+    """
+    lat, lng = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    dlat = lat[:, None] - lat[None, :]
+    dlng = lng[:, None] - lng[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def transport_cost(distance_km: np.ndarray, crop_weight_kg: Union[float, np.ndarray],
+                   fuel_price: float) -> np.ndarray:
+    """Transport cost for the given distances and weights; broadcasts like NumPy"""
+    return distance_km / KM_PER_LITER * fuel_price * FUEL_LOAD_FACTOR + \
+        distance_km * BASE_COST_PER_KM * (np.asarray(crop_weight_kg) / 100)
+
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# eager: load everything at import (the default)
+# background: start serving immediately and load everything on a background thread
+# lazy: load on-demand subsystems on first use; one-shot setup still runs in the background
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "eager").lower()
+
+
+class Subsystem:
+    def __init__(self, name: str, loader: Callable[[], Any], on_demand: bool = False):
+        self.name = name
+        self.loader = loader
+        self.on_demand = on_demand
+        self.status = "pending"
+        self.error = None
+        self.value = None
+        self.load_seconds = None
+        self.lock = threading.Lock()
+
+
+class Warmup:
+    """
+    Tracks the slow-to-start parts of the app (models, database, demo data).
+
+    Each subsystem is registered with a loader that is run at most once
+    successfully. require() loads on demand and blocks while another thread
+    is loading the same subsystem; a failed load is retried on the next call.
+    """
+
+    def __init__(self):
+        self._subsystems: Dict[str, Subsystem] = {}
+        self.mode = STARTUP_MODE
+
+    def register(self, name: str, loader: Callable[[], Any], on_demand: bool = False):
+        """
+        Add a subsystem
+
+        on_demand subsystems are fetched with require() where they are used,
+        so lazy mode leaves them until then. Everything else (one-shot setup
+        such as index creation) is warmed in every mode.
+        """
+        self._subsystems[name] = Subsystem(name, loader, on_demand)
+
+    def _load(self, subsystem: Subsystem) -> Any:
+        with subsystem.lock:
+            if subsystem.status == "ready":
+                return subsystem.value
+
+            subsystem.status = "loading"
+            started = time.perf_counter()
+            try:
+                subsystem.value = subsystem.loader()
+            except Exception as e:
+                subsystem.status = "failed"
+                subsystem.error = str(e)
+                print(f"Error warming up {subsystem.name}: {str(e)}")
+                raise
+            subsystem.load_seconds = round(time.perf_counter() - started, 3)
+            subsystem.status = "ready"
+            subsystem.error = None
+            print(f"{subsystem.name} ready in {subsystem.load_seconds}s")
+            return subsystem.value
+
+    def require(self, name: str) -> Any:
+        """Return the subsystem's loaded value, loading it now if needed"""
+        subsystem = self._subsystems[name]
+        if subsystem.status == "ready":
+            return subsystem.value
+        return self._load(subsystem)
+
+    def peek(self, name: str) -> Optional[Any]:
+        """Return the subsystem's value if it is already loaded, without loading it"""
+        subsystem = self._subsystems[name]
+        return subsystem.value if subsystem.status == "ready" else None
+
+    def _load_all(self, include_on_demand: bool = True):
+        for subsystem in self._subsystems.values():
+            if subsystem.on_demand and not include_on_demand:
+                continue
+            try:
+                self._load(subsystem)
+            except Exception:
+                # Already recorded on the subsystem; keep warming the rest
+                continue
+
+    def start(self, mode: str = STARTUP_MODE):
+        if mode == "eager":
+            self._load_all()
+        elif mode == "background":
+            threading.Thread(target=self._load_all, name="warmup", daemon=True).start()
+        elif mode == "lazy":
+            threading.Thread(target=self._load_all, args=(False,), name="warmup", daemon=True).start()
+        else:
+            raise ValueError(f"Unknown startup mode: {mode}")
+        self.mode = mode
+
+    def ready(self) -> bool:
+        """True once every subsystem is loaded; in lazy mode on-demand ones don't count"""
+        return all(s.status == "ready" for s in self._subsystems.values()
+                   if not (s.on_demand and self.mode == "lazy"))
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {"status": s.status, "error": s.error, "load_seconds": s.load_seconds, "on_demand": s.on_demand}
+            for name, s in self._subsystems.items()
+        }
+
+
+warmup = Warmup()
@@ -100,11 +100,17 @@ export const auth = {
 };
 
 export const yields = {
-  // Get all yields for the current user
+  // Get all yields for the current user, following the X-Next-Cursor pages
   getAll: async () => {
     try {
-      const response = await api.get('/yields');
-      return response.data;
+      const all = [];
+      let cursor: string | undefined;
+      do {
+        const response = await api.get('/yields', { params: cursor ? { cursor } : {} });
+        all.push(...response.data);
+        cursor = response.headers['x-next-cursor'];
+      } while (cursor);
+      return all;
     } catch (error) {
       console.error('Error fetching yields:', error);
       throw error;
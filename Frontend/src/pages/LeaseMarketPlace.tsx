@@ -53,21 +53,34 @@ const LeaseMarketplace: React.FC = () => {
     imageUrl: '',
   });
   
-  // Fetch equipment data and categories on component mount
+  // Fetch equipment matching the search and category, following next_cursor
+  // so every matching listing is shown, not just the first page
   useEffect(() => {
     const fetchEquipmentData = async () => {
       setIsLoading(true);
       try {
-        const response = await api.get('/lease-items');
-        console.log("Lease items API response:", response.data);
-        
-        if (response.data.status === 'success' && Array.isArray(response.data.data)) {
-          setEquipmentData(response.data.data);
-        } else {
-          console.error('Invalid data format from API:', response.data);
-          toast.error('Failed to load equipment data: Invalid response format');
-          setEquipmentData([]);
-        }
+        const items: Equipment[] = [];
+        let cursor: string | null = null;
+        do {
+          const response = await api.get('/lease-items', {
+            params: {
+              ...(searchQuery ? { q: searchQuery } : {}),
+              ...(selectedCategory ? { category: selectedCategory } : {}),
+              ...(cursor ? { cursor } : {})
+            }
+          });
+          console.log("Lease items API response:", response.data);
+
+          if (response.data.status !== 'success' || !Array.isArray(response.data.data)) {
+            console.error('Invalid data format from API:', response.data);
+            toast.error('Failed to load equipment data: Invalid response format');
+            setEquipmentData([]);
+            return;
+          }
+          items.push(...response.data.data);
+          cursor = response.data.next_cursor || null;
+        } while (cursor);
+        setEquipmentData(items);
       } catch (error) {
         console.error('Error fetching equipment data:', error);
         if (axios.isAxiosError(error)) {
@@ -76,8 +89,17 @@ const LeaseMarketplace: React.FC = () => {
         }
         toast.error('Failed to load equipment data');
         setEquipmentData([]);
+      } finally {
+        setIsLoading(false);
       }
-      
+    };
+    
+    fetchEquipmentData();
+  }, [searchQuery, selectedCategory]);
+
+  // Fetch categories on component mount
+  useEffect(() => {
+    const fetchCategories = async () => {
       try {
         const categoriesResponse = await api.get('/lease-items/categories');
         console.log("Categories API response:", categoriesResponse.data);
@@ -97,12 +119,10 @@ const LeaseMarketplace: React.FC = () => {
         }
         toast.error('Failed to load categories');
         setCategories([]);
-      } finally {
-        setIsLoading(false);
       }
     };
     
-    fetchEquipmentData();
+    fetchCategories();
   }, []);
 
   // Function to handle search
@@ -115,16 +135,8 @@ const LeaseMarketplace: React.FC = () => {
     setSelectedCategory(selectedCategory === category ? null : category);
   };
 
-  // Filter equipment based on search and category
-  const filteredEquipment = equipmentData.filter(item => {
-    const matchesSearch = !searchQuery || 
-      item.name.toLowerCase().includes(searchQuery.toLowerCase()) || 
-      item.description.toLowerCase().includes(searchQuery.toLowerCase());
-    
-    const matchesCategory = !selectedCategory || item.category === selectedCategory;
-    
-    return matchesSearch && matchesCategory;
-  });
+  // Search and category are applied by the server (q and category params)
+  const filteredEquipment = equipmentData;
 
   // Function to handle calling the owner
   const handleCallOwner = (phoneNumber: string | undefined) => {
@@ -242,16 +242,24 @@ const YieldDetails = () => {
       const yieldStatus = yieldResponse.data.status || "Active";
       console.log("Yield status from backend:", yieldStatus);
       
-      // 2. Fetch the activities for this yield
-      const activitiesResponse = await axios.post("http://localhost:5000/api/activities", {
-        yield_id: yieldId,
-        mobileno: mobileNo
-      }, {
-        headers: {
-          "Content-Type": "application/json",
-          "x-access-token": localStorage.getItem("userToken")
-        }
-      });
+      // 2. Fetch the activities for this yield, following next_cursor until the last page
+      const allActivities: any[] = [];
+      let cursor: string | null = null;
+      do {
+        const pageResponse = await axios.post("http://localhost:5000/api/activities", {
+          yield_id: yieldId,
+          mobileno: mobileNo,
+          ...(cursor ? { cursor } : {})
+        }, {
+          headers: {
+            "Content-Type": "application/json",
+            "x-access-token": localStorage.getItem("userToken")
+          }
+        });
+        allActivities.push(...(pageResponse.data?.activities || []));
+        cursor = pageResponse.data?.next_cursor || null;
+      } while (cursor);
+      const activitiesResponse = { data: { activities: allActivities } };
       
       console.log("Activities response:", activitiesResponse.data);
       